@@ -1,7 +1,6 @@
 import typing as tp
 import uuid
 
-import bcrypt
 from sqlalchemy import Boolean, Integer, String, Text, select, update
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
@@ -10,6 +9,7 @@ from fastadmin import SqlAlchemyModelAdmin, register
 
 from app.models.user import User
 from app.backend.db import async_session_maker
+from app.services.passwords import password_hasher
 
 
 @register(User, sqlalchemy_sessionmaker=async_session_maker)
@@ -28,14 +28,18 @@ class UserAdmin(SqlAlchemyModelAdmin):
             obj = result.first()
             if not obj:
                 return None
-            if not bcrypt.checkpw(password.encode(), obj.hashed_password.encode()):
+            valid, new_hash = await password_hasher.verify_and_update(password, obj.hashed_password)
+            if not valid:
                 return None
+            if new_hash is not None:
+                await session.execute(update(self.model_cls).where(User.id == obj.id).values(hashed_password=new_hash))
+                await session.commit()
             return obj.id
 
     async def change_password(self, id: uuid.UUID | int, password: str) -> None:
         sessionmaker = self.get_sessionmaker()
         async with sessionmaker() as session:
-            hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+            hashed_password = await password_hasher.hash(password)
             query = update(self.model_cls).where(User.id.in_([id])).values(hashed_password=hashed_password)
             await session.execute(query)
             await session.commit()
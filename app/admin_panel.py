@@ -10,7 +10,6 @@ from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.templating import Jinja2Templates
-from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr, ValidationError, constr
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
@@ -18,6 +17,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.backend.db_depends import get_db
 from app.models.user import User
+from app.services.passwords import password_hasher
+from app.services.tokens import token_revocations
 
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "secret"
@@ -31,7 +32,6 @@ router = APIRouter(prefix="/admin", tags=["Admin"], include_in_schema=False)
 
 strict_basic = HTTPBasic()
 optional_basic = HTTPBasic(auto_error=False)
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 class UserBase(BaseModel):
@@ -220,7 +220,7 @@ async def create_user(
         last_name=payload.last_name,
         username=payload.username,
         email=payload.email,
-        hashed_password=password_context.hash(payload.password),
+        hashed_password=await password_hasher.hash(payload.password),
         is_active=payload.is_active,
         is_admin=payload.is_admin,
         is_supplier=payload.is_supplier,
@@ -331,7 +331,7 @@ async def update_user(
     user.is_customer = payload.is_customer
 
     if payload.password:
-        user.hashed_password = password_context.hash(payload.password)
+        user.hashed_password = await password_hasher.hash(payload.password)
 
     try:
         await db.commit()
@@ -351,6 +351,8 @@ async def update_user(
             context,
             status_code=status.HTTP_400_BAD_REQUEST,
         )
+    # Роли, активность или пароль могли измениться — выданные токены пользователя отзываются.
+    await token_revocations.revoke_user(user_id)
 
     return RedirectResponse(
         url="/admin/users?message=Изменения сохранены",
@@ -370,6 +372,7 @@ async def delete_user(
 
     await db.delete(user)
     await db.commit()
+    await token_revocations.revoke_user(user_id)
 
     return RedirectResponse(
         url="/admin/users?message=Пользователь удалён",
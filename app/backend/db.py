@@ -1,9 +1,13 @@
 import os
 from dotenv import load_dotenv
 
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
+from app.backend.pool import InstrumentedPool
+from app.core.settings import settings
+
 
 load_dotenv()
 
@@ -14,9 +18,58 @@ if not DATABASE_URL:
         "Provide a valid SQLAlchemy connection string to configure the database engine."
     )
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+def engine_options(url: str) -> dict:
+    """Pool and driver options from settings (DB_POOL_*, DB_STATEMENT_CACHE_SIZE).
+
+    Limits are per process: every gunicorn worker and every Celery process
+    opens up to pool_size + max_overflow connections.
+    """
+
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # База в памяти живёт в единственном соединении — пул не настраивается.
+        return {}
+    options = {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if url.get_driver_name() == "asyncpg":
+        # 0 отключает подготовленные запросы (нужно за pgbouncer в режиме transaction).
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "statement_cache_size": settings.db_statement_cache_size,
+        }
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, echo=False, **engine_options(DATABASE_URL))
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+# Реплика для чтения (DATABASE_REPLICA_URL). Без неё все запросы идут в основную базу.
+# Сессии реплики помечены в info: кэш запросов и вспомогательные сессии отличают их от основной.
+REPLICA_SESSION = "read_replica"
+replica_engine = (
+    create_async_engine(settings.database_replica_url, echo=False, **engine_options(settings.database_replica_url))
+    if settings.database_replica_url else None
+)
+replica_session_maker = (
+    async_sessionmaker(replica_engine, expire_on_commit=False, class_=AsyncSession, info={REPLICA_SESSION: True})
+    if replica_engine is not None else None
+)
+
+
+def session_maker_for(session: AsyncSession) -> async_sessionmaker:
+    """Factory for extra sessions (counts, facets, streams) reading from the same database as ``session``."""
+
+    if replica_session_maker is not None and session.info.get(REPLICA_SESSION):
+        return replica_session_maker
+    return async_session_maker
+
 
 class Base(DeclarativeBase):
     pass
\ No newline at end of file
@@ -1,9 +1,39 @@
 from typing import AsyncGenerator
+
+from fastapi import Request
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.backend.db import async_session_maker
+from app.backend.db import async_session_maker, replica_session_maker
+from app.backend.replica import WROTE_PRIMARY, primary_pinned, replica_health
+from app.services.query_cache import publish_session_writes
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+        try:
+            yield session
+        finally:
+            # Сообщаем остальным воркерам о закоммиченных изменениях до отправки ответа.
+            if await publish_session_writes(session):
+                # Клиент, который только что писал, какое-то время читает из основной базы.
+                setattr(request.state, WROTE_PRIMARY, True)
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Session for read-only handlers: the replica when it is usable, the primary otherwise."""
+
+    if replica_session_maker is None or primary_pinned(request.cookies) or not await replica_health.usable():
+        replica_health.primary_reads += 1
+        async with async_session_maker() as session:
+            yield session
+        return
+
+    replica_health.replica_reads += 1
+    async with replica_session_maker() as session:
+        try:
+            yield session
+        except (OperationalError, InterfaceError, OSError) as exc:
+            # Этот запрос уже не спасти, но следующие пойдут в основную базу.
+            replica_health.mark_down(exc)
+            raise
@@ -0,0 +1,90 @@
+"""Connection pool instrumentation.
+
+:class:`InstrumentedPool` is the regular asyncio queue pool that also
+records, per worker process, how long checkouts waited for a connection,
+how many timed out and how often a connection beyond ``DB_POOL_SIZE`` had
+to be opened (overflow). :func:`pool_status` combines these counters with
+the live state of the pool; it backs ``GET /v1/metrics/db_pool``.
+"""
+
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+@dataclass
+class PoolMetrics:
+    checkouts: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    # Ожидания дольше SLOW_WAIT: пул слишком мал для нагрузки воркера.
+    slow_waits: int = 0
+    timeouts: int = 0
+    overflow_events: int = 0
+
+    SLOW_WAIT = 0.05
+
+    def reset(self) -> None:
+        self.checkouts = self.slow_waits = self.timeouts = self.overflow_events = 0
+        self.wait_total = self.wait_max = 0.0
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """``AsyncAdaptedQueuePool`` that times every checkout."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        metrics = self.metrics
+        overflow = self._overflow
+        started = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            metrics.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        metrics.checkouts += 1
+        metrics.wait_total += waited
+        metrics.wait_max = max(metrics.wait_max, waited)
+        if waited >= metrics.SLOW_WAIT:
+            metrics.slow_waits += 1
+        # _overflow отсчитывается от -pool_size: положительное значение — соединения сверх пула.
+        if self._overflow > overflow and self._overflow > 0:
+            metrics.overflow_events += 1
+        return entry
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def pool_status(pool: Pool) -> dict:
+    """Live pool state plus the checkout counters (when the pool is instrumented)."""
+
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(
+            checkouts=metrics.checkouts,
+            wait_avg_ms=round(metrics.wait_total / metrics.checkouts * 1000, 3) if metrics.checkouts else 0.0,
+            wait_max_ms=round(metrics.wait_max * 1000, 3),
+            slow_waits=metrics.slow_waits,
+            timeouts=metrics.timeouts,
+            overflow_events=metrics.overflow_events,
+        )
+    return status
@@ -0,0 +1,160 @@
+"""Routing of read-only requests to a database replica.
+
+GET handlers of the catalog take their session from
+:func:`app.backend.db_depends.get_read_db`. It uses the replica
+(``DATABASE_REPLICA_URL``) unless one of these holds, in which case it
+falls back to the primary:
+
+* the client wrote recently. When a request commits through ``get_db``,
+  :class:`ReadYourWritesMiddleware` sets a cookie pinning the client to the
+  primary for ``READ_YOUR_WRITES_WINDOW`` seconds, so it reads its own
+  writes even while the replica lags. The cookie carries the state, so the
+  pin works across workers without shared storage;
+* the replica is behind by more than ``REPLICA_MAX_LAG`` seconds. The lag is
+  measured by :class:`ReplicaHealth` at most once per
+  ``REPLICA_CHECK_INTERVAL`` per worker;
+* the replica is down. A failed lag check or a connection error during a
+  request marks it down for ``REPLICA_RETRY_AFTER`` seconds. The request
+  that hit the error still fails; the following ones go to the primary.
+"""
+
+import asyncio
+import math
+import time
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.backend.db import replica_engine
+from app.core.settings import settings
+
+PRIMARY_COOKIE = "read_primary_until"
+# Ключ в request.state: запрос закоммитил изменения в основной базе.
+WROTE_PRIMARY = "wrote_primary"
+
+# На простаивающем мастере pg_last_xact_replay_timestamp() стареет и без отставания,
+# поэтому при полностью применённом WAL отставание считаем нулевым.
+_POSTGRES_LAG = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+
+class ReplicaHealth:
+    """Per-worker view of whether the replica may serve reads."""
+
+    CHECK_TIMEOUT = 1.0
+
+    def __init__(
+            self,
+            engine: AsyncEngine | None,
+            *,
+            max_lag: float = settings.replica_max_lag,
+            check_interval: float = settings.replica_check_interval,
+            retry_after: float = settings.replica_retry_after,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self._clock = clock
+        self.lag: float | None = None
+        self._checked_at = -math.inf
+        self._down_until = -math.inf
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failures = 0
+
+    @property
+    def down(self) -> bool:
+        return self._clock() < self._down_until
+
+    def mark_down(self, reason: object) -> None:
+        self._down_until = self._clock() + self.retry_after
+        self.lag = None
+        self.failures += 1
+        logger.warning(f"Read replica unavailable, reading from primary for {self.retry_after:g}s: {reason}")
+
+    async def _measure(self) -> float:
+        async with self.engine.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                return float(await connection.scalar(_POSTGRES_LAG) or 0.0)
+            await connection.execute(text("SELECT 1"))
+            return 0.0
+
+    async def usable(self) -> bool:
+        """Whether the replica is up and within ``max_lag``; re-measures the lag when the last check is stale."""
+
+        if self.engine is None or self.down:
+            return False
+        now = self._clock()
+        if now - self._checked_at >= self.check_interval:
+            # Отметка до await: параллельные запросы не запускают повторную проверку.
+            self._checked_at = now
+            try:
+                self.lag = await asyncio.wait_for(self._measure(), self.CHECK_TIMEOUT)
+            except Exception as exc:
+                self.mark_down(exc)
+                return False
+        return self.lag is not None and self.lag <= self.max_lag
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.engine is not None,
+            "down": self.down,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "failures": self.failures,
+        }
+
+
+def primary_pinned(cookies: dict[str, str], window: float = settings.read_your_writes_window) -> bool:
+    """Whether the read-your-writes cookie still pins the client to the primary."""
+
+    try:
+        until = float(cookies.get(PRIMARY_COOKIE, ""))
+    except ValueError:
+        return False
+    now = time.time()
+    # Значение дальше окна — подделка или старая настройка; такой куке не доверяем.
+    return now < until <= now + window
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware setting the primary pin cookie on responses to requests that committed writes."""
+
+    def __init__(self, app, *, window: float = settings.read_your_writes_window):
+        self.app = app
+        self.window = window
+
+    def _cookie(self) -> bytes:
+        until = time.time() + self.window
+        return (
+            f"{PRIMARY_COOKIE}={until:.3f}; Max-Age={math.ceil(self.window)}; Path=/; HttpOnly; SameSite=Lax"
+        ).encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.window <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        # Общий словарь request.state: get_db отмечает в нём запись до отправки ответа.
+        state = scope.setdefault("state", {})
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and state.get(WROTE_PRIMARY):
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", self._cookie())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+replica_health = ReplicaHealth(replica_engine)
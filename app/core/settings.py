@@ -20,6 +20,48 @@ class Settings(BaseSettings):
         alias="CELERY_RESULT_BACKEND",
     )
     cors_origins: List[str] = Field(default_factory=lambda: ["https://example.com"], alias="CORS_ORIGINS")
+    count_cache_ttl: float = Field(30.0, alias="COUNT_CACHE_TTL")
+    count_cache_size: int = Field(1024, alias="COUNT_CACHE_SIZE")
+    suggest_refresh_interval: float = Field(300.0, alias="SUGGEST_REFRESH_INTERVAL")
+    category_tree_ttl: float = Field(60.0, alias="CATEGORY_TREE_TTL")
+    query_cache_ttl: float = Field(60.0, alias="QUERY_CACHE_TTL")
+    query_cache_size: int = Field(2048, alias="QUERY_CACHE_SIZE")
+    query_cache_redis_url: str | None = Field(None, alias="QUERY_CACHE_REDIS_URL")
+    import_batch_size: int = Field(500, alias="IMPORT_BATCH_SIZE")
+    export_yield_per: int = Field(1000, alias="EXPORT_YIELD_PER")
+    facet_price_buckets: int = Field(10, alias="FACET_PRICE_BUCKETS")
+    review_queue_size: int = Field(10000, alias="REVIEW_QUEUE_SIZE")
+    review_batch_size: int = Field(200, alias="REVIEW_BATCH_SIZE")
+    review_flush_interval: float = Field(0.5, alias="REVIEW_FLUSH_INTERVAL")
+    review_queue_put_timeout: float = Field(1.0, alias="REVIEW_QUEUE_PUT_TIMEOUT")
+    review_flush_retries: int = Field(3, alias="REVIEW_FLUSH_RETRIES")
+    review_flush_backoff: float = Field(0.5, alias="REVIEW_FLUSH_BACKOFF")
+    password_bcrypt_rounds: int = Field(12, alias="PASSWORD_BCRYPT_ROUNDS")
+    password_hash_workers: int = Field(4, alias="PASSWORD_HASH_WORKERS")
+    rate_limit_enabled: bool = Field(True, alias="RATE_LIMIT_ENABLED")
+    rate_limit_default: str = Field("120/60", alias="RATE_LIMIT_DEFAULT")
+    rate_limit_search: str = Field("30/60", alias="RATE_LIMIT_SEARCH")
+    rate_limit_auth: str = Field("10/60", alias="RATE_LIMIT_AUTH")
+    rate_limit_max_in_flight: int = Field(200, alias="RATE_LIMIT_MAX_IN_FLIGHT")
+    rate_limit_redis_url: str | None = Field(None, alias="RATE_LIMIT_REDIS_URL")
+    # Число обратных прокси перед приложением (в поставке — один nginx); 0 — X-Forwarded-For не читается.
+    rate_limit_trusted_proxies: int = Field(1, alias="RATE_LIMIT_TRUSTED_PROXIES")
+    access_token_ttl: float = Field(900.0, alias="ACCESS_TOKEN_TTL")
+    token_cache_size: int = Field(10000, alias="TOKEN_CACHE_SIZE")
+    auth_redis_url: str | None = Field(None, alias="AUTH_REDIS_URL")
+    # Число воркеров (переменную читают и gunicorn, и uvicorn); при нескольких воркерах нужны общие Redis-хранилища.
+    web_concurrency: int = Field(1, alias="WEB_CONCURRENCY")
+    db_pool_size: int = Field(5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(30.0, alias="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(1800, alias="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(True, alias="DB_POOL_PRE_PING")
+    db_statement_cache_size: int = Field(100, alias="DB_STATEMENT_CACHE_SIZE")
+    database_replica_url: str | None = Field(None, alias="DATABASE_REPLICA_URL")
+    read_your_writes_window: float = Field(5.0, alias="READ_YOUR_WRITES_WINDOW")
+    replica_max_lag: float = Field(5.0, alias="REPLICA_MAX_LAG")
+    replica_check_interval: float = Field(2.0, alias="REPLICA_CHECK_INTERVAL")
+    replica_retry_after: float = Field(30.0, alias="REPLICA_RETRY_AFTER")
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
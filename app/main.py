@@ -3,6 +3,7 @@ from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from starlette.websockets import WebSocketDisconnect
 from celery import Celery
+from loguru import logger
 import os
 
 from app.admin_panel import router as admin_router
@@ -12,6 +13,10 @@ from app.main_routers import setup_routers
 from app.middleware import add_middlewares
 from app.timing import TimingMiddleWare
 from app.core.settings import settings
+from app.services.passwords import password_hasher
+from app.services.review_queue import review_queue
+from app.services.suggest import product_suggestions
+from app.services.tokens import token_revocations
 
 
 
@@ -90,6 +95,42 @@ add_middlewares(
 setup_routers(app)
 
 
+# Прогрев in-memory индексов воркера (автодополнение товаров) при запуске
+@app.on_event("startup")
+async def warm_up_indexes():
+    try:
+        await product_suggestions.refresh()
+    except Exception as ex:
+        # Индекс построится при первом запросе к /v1/products/suggest
+        logger.error(f"Product suggestion index warm-up failed: {ex}")
+    # Подписка воркера на отзывы токенов, сделанные другими воркерами
+    await token_revocations.start()
+
+
+# Без Redis отзывы токенов, лимиты и версии кэша запросов у каждого воркера свои
+@app.on_event("startup")
+async def check_shared_state():
+    if settings.web_concurrency <= 1:
+        return
+    stores = [
+        ("AUTH_REDIS_URL", settings.auth_redis_url, "revoked tokens stay valid on other workers"),
+        ("QUERY_CACHE_REDIS_URL", settings.query_cache_redis_url, "writes invalidate the query cache of one worker"),
+    ]
+    if settings.rate_limit_enabled:
+        stores.append(("RATE_LIMIT_REDIS_URL", settings.rate_limit_redis_url, "rate limits are counted per worker"))
+    for name, url, effect in stores:
+        if url is None:
+            logger.warning(f"{name} is not set with {settings.web_concurrency} workers: {effect}")
+
+
+# Запись накопленных отзывов и остановка пула хэширования паролей перед остановкой воркера
+@app.on_event("shutdown")
+async def shutdown_background_work():
+    await review_queue.drain()
+    password_hasher.shutdown()
+    await token_revocations.stop()
+
+
 # Маршрут для корневого пути с использованием Jinja2Templates
 @app.get("/", response_class=HTMLResponse)
 def read_index(request: Request):
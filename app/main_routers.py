@@ -1,7 +1,7 @@
 from fastapi import FastAPI
 
 
-from app.routers.v1 import auth, category, permission, products, reviews, session
+from app.routers.v1 import auth, category, metrics, permission, products, reviews, session
 from app.tasks import call_background_task
 
 
@@ -22,6 +22,7 @@ def setup_routers(app: FastAPI):
     app_v1.include_router(permission.router)
     app_v1.include_router(reviews.router)
     app_v1.include_router(session.router)
+    app_v1.include_router(metrics.router)
 
     # Монтируем подприложения к основному приложению
     app.mount('/v1', app_v1)
@@ -7,7 +7,9 @@ from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
+from app.backend.replica import ReadYourWritesMiddleware
 from app.core.settings import settings
+from app.services.rate_limit import RateLimitMiddleware
 
 
 def add_middlewares(
@@ -43,4 +45,13 @@ def add_middlewares(
     """
 
     # Настройка GZipMiddleware
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
\ No newline at end of file
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+    # Read-your-writes: после записи клиент получает куку и на время окна читает из основной базы, а не из реплики
+    if settings.database_replica_url and settings.read_your_writes_window > 0:
+        app.add_middleware(ReadYourWritesMiddleware)
+
+    # Ограничение частоты запросов и сброс нагрузки; добавляется последним, чтобы отклонять запросы
+    # до остальных middleware
+    if settings.rate_limit_enabled:
+        app.add_middleware(RateLimitMiddleware)
@@ -0,0 +1,41 @@
+"""product full-text search vector
+
+Revision ID: 8b7d4e2f6a13
+Revises: 3f1c2a9d8e01
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b7d4e2f6a13'
+down_revision: Union[str, None] = '3f1c2a9d8e01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Генерируемая колонка поддерживается самим PostgreSQL при каждом INSERT/UPDATE.
+    op.execute(
+        "ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED"
+    )
+    op.create_index(
+        'ix_products_search_vector',
+        'products',
+        ['search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_search_vector', table_name='products', postgresql_using='gin')
+    op.drop_column('products', 'search_vector')
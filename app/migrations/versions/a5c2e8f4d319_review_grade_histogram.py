@@ -0,0 +1,48 @@
+"""review grade histogram on products
+
+Revision ID: a5c2e8f4d319
+Revises: f1a8d4b6c237
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5c2e8f4d319'
+down_revision: Union[str, None] = 'f1a8d4b6c237'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for star in STARS:
+        op.add_column('products', sa.Column(f'stars_{star}', sa.Integer(), server_default='0', nullable=False))
+    # Корзина — целая часть оценки (4.5 -> 4); сравнение вместо CAST, который в разных СУБД округляет по-разному.
+    buckets = {
+        1: 'reviews.grade < 2',
+        2: 'reviews.grade >= 2 AND reviews.grade < 3',
+        3: 'reviews.grade >= 3 AND reviews.grade < 4',
+        4: 'reviews.grade >= 4 AND reviews.grade < 5',
+        5: 'reviews.grade >= 5',
+    }
+    assignments = ",\n".join(
+        f"""stars_{star} = (
+                SELECT count(*) FROM reviews
+                WHERE reviews.product_id = products.id AND reviews.is_active AND {condition}
+            )"""
+        for star, condition in buckets.items()
+    )
+    op.execute(f"UPDATE products SET {assignments}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for star in reversed(STARS):
+        op.drop_column('products', f'stars_{star}')
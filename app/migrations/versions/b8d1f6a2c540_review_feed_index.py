@@ -0,0 +1,31 @@
+"""review feed index
+
+Revision ID: b8d1f6a2c540
+Revises: a5c2e8f4d319
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d1f6a2c540'
+down_revision: Union[str, None] = 'a5c2e8f4d319'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Лента отзывов товара с keyset-пагинацией читается одним диапазоном индекса.
+    op.create_index(
+        'ix_reviews_product_feed', 'reviews', ['product_id', 'is_active', sa.text('id DESC')],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reviews_product_feed', table_name='reviews')
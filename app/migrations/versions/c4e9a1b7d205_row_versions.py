@@ -0,0 +1,31 @@
+"""row versions for products and categories
+
+Revision ID: c4e9a1b7d205
+Revises: 8b7d4e2f6a13
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e9a1b7d205'
+down_revision: Union[str, None] = '8b7d4e2f6a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Версия строки — источник ETag; существующие строки получают версию 1.
+    op.add_column('categories', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('products', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'version')
+    op.drop_column('categories', 'version')
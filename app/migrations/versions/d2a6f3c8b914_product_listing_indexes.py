@@ -0,0 +1,44 @@
+"""partial indexes for product listing sorts
+
+Revision ID: d2a6f3c8b914
+Revises: c4e9a1b7d205
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a6f3c8b914'
+down_revision: Union[str, None] = 'c4e9a1b7d205'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Все публичные списки фильтруют is_active AND stock > 0, поэтому индексы частичные:
+# снятые с продажи товары и пустые остатки в них не попадают.
+LISTED = sa.text('is_active AND stock > 0')
+
+INDEXES = {
+    'ix_products_listed_id': ['id'],
+    'ix_products_listed_price': ['price', 'id'],
+    'ix_products_listed_rating': ['rating', 'id'],
+    'ix_products_listed_category_id': ['category_id', 'id'],
+    'ix_products_listed_category_price': ['category_id', 'price', 'id'],
+    'ix_products_listed_category_rating': ['category_id', 'rating', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'products', columns, unique=False, postgresql_where=LISTED)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(list(INDEXES)):
+        op.drop_index(name, table_name='products')
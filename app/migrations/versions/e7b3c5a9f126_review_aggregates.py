@@ -0,0 +1,50 @@
+"""review aggregates on products
+
+Revision ID: e7b3c5a9f126
+Revises: d2a6f3c8b914
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3c5a9f126'
+down_revision: Union[str, None] = 'd2a6f3c8b914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('review_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('products', sa.Column('grade_sum', sa.Float(), server_default='0', nullable=False))
+    # Начальные значения — по активным отзывам; дальше их поддерживают запросы записи отзывов.
+    # rating пересчитывается тем же запросом, как в _rating: уже разошедшийся рейтинг исправляется сразу.
+    op.execute(
+        """
+        UPDATE products SET
+            review_count = (
+                SELECT count(*) FROM reviews
+                WHERE reviews.product_id = products.id AND reviews.is_active
+            ),
+            grade_sum = (
+                SELECT coalesce(sum(reviews.grade), 0) FROM reviews
+                WHERE reviews.product_id = products.id AND reviews.is_active
+            ),
+            rating = (
+                SELECT CASE WHEN count(*) > 0 THEN round(CAST(sum(reviews.grade) / count(*) AS NUMERIC), 2) ELSE 0 END
+                FROM reviews
+                WHERE reviews.product_id = products.id AND reviews.is_active
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'grade_sum')
+    op.drop_column('products', 'review_count')
@@ -0,0 +1,59 @@
+"""unique review per user and product
+
+Revision ID: f1a8d4b6c237
+Revises: e7b3c5a9f126
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a8d4b6c237'
+down_revision: Union[str, None] = 'e7b3c5a9f126'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дубликаты, проскочившие через прежнюю проверку SELECT-ом при гонке: оставляем первый отзыв.
+    op.execute(
+        """
+        DELETE FROM reviews
+        WHERE id NOT IN (
+            SELECT min(id) FROM reviews
+            WHERE user_id IS NOT NULL AND product_id IS NOT NULL
+            GROUP BY user_id, product_id
+        )
+        AND user_id IS NOT NULL AND product_id IS NOT NULL
+        """
+    )
+    # Удалённые дубликаты могли входить в агрегаты и рейтинг — пересчитываем их.
+    op.execute(
+        """
+        UPDATE products SET
+            review_count = (
+                SELECT count(*) FROM reviews
+                WHERE reviews.product_id = products.id AND reviews.is_active
+            ),
+            grade_sum = (
+                SELECT coalesce(sum(reviews.grade), 0) FROM reviews
+                WHERE reviews.product_id = products.id AND reviews.is_active
+            ),
+            rating = (
+                SELECT CASE WHEN count(*) > 0 THEN round(CAST(sum(reviews.grade) / count(*) AS NUMERIC), 2) ELSE 0 END
+                FROM reviews
+                WHERE reviews.product_id = products.id AND reviews.is_active
+            )
+        """
+    )
+    op.create_index('uq_reviews_user_product', 'reviews', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_reviews_user_product', table_name='reviews')
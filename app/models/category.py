@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, text
 from sqlalchemy.orm import relationship
 
 from app.backend.db import Base
@@ -15,6 +15,10 @@ class Category(Base):
     slug = Column(String, unique=True, index=True)
     is_active = Column(Boolean, default=True)
     parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    # Версия строки: растёт при каждом UPDATE, используется для ETag.
+    version = Column(Integer, nullable=False, default=1, server_default='1', onupdate=text('version + 1'))
 
     products = relationship("Product", back_populates="category", uselist=True)
 
+    __mapper_args__ = {'eager_defaults': True}
+
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey
+from sqlalchemy import DDL, Column, Index, Integer, String, Boolean, Float, ForeignKey, and_, event, literal_column, text
 from sqlalchemy.orm import relationship
 
 from app.backend.db import Base
@@ -18,6 +18,69 @@ class Product(Base):
     supplier_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     category_id = Column(Integer, ForeignKey('categories.id'))
     rating = Column(Float, default=0.0, nullable=False)
+    # Агрегаты активных отзывов; меняются тем же запросом, что и отзыв, rating выводится из них.
+    review_count = Column(Integer, nullable=False, default=0, server_default='0')
+    grade_sum = Column(Float, nullable=False, default=0.0, server_default='0')
+    # Гистограмма оценок активных отзывов: stars_N — число отзывов с оценкой в [N, N + 1).
+    stars_1 = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_2 = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_3 = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_4 = Column(Integer, nullable=False, default=0, server_default='0')
+    stars_5 = Column(Integer, nullable=False, default=0, server_default='0')
     is_active = Column(Boolean, default=True)
+    # Версия строки: растёт при каждом UPDATE (ORM и Core), используется для ETag.
+    version = Column(Integer, nullable=False, default=1, server_default='1', onupdate=text('version + 1'))
 
-    category = relationship('Category', back_populates='products')
\ No newline at end of file
+    category = relationship('Category', back_populates='products')
+
+    # Новая версия возвращается через RETURNING, иначе обращение к ней в async-коде вызвало бы ленивую загрузку.
+    __mapper_args__ = {'eager_defaults': True}
+
+
+# Условие «товар на витрине», общее для всех публичных выборок. Ноль подставляется литералом:
+# с bind-параметром ни PostgreSQL (generic plan), ни SQLite не докажут предикат частичного индекса.
+LISTED_PRODUCT = (Product.is_active == True, Product.stock > literal_column('0'))
+
+# Частичные индексы под сортировки списков (см. PRODUCT_SORTS в app/routers/v1/products.py).
+# Убывающие сортировки используют те же индексы обратным сканированием.
+for _name, _columns in {
+    'ix_products_listed_id': (Product.id,),
+    'ix_products_listed_price': (Product.price, Product.id),
+    'ix_products_listed_rating': (Product.rating, Product.id),
+    'ix_products_listed_category_id': (Product.category_id, Product.id),
+    'ix_products_listed_category_price': (Product.category_id, Product.price, Product.id),
+    'ix_products_listed_category_rating': (Product.category_id, Product.rating, Product.id),
+}.items():
+    Index(_name, *_columns, postgresql_where=and_(*LISTED_PRODUCT), sqlite_where=and_(*LISTED_PRODUCT))
+
+# Полнотекстовый индекс товаров (см. app/services/search.py). В PostgreSQL это генерируемая
+# колонка search_vector с GIN-индексом, в SQLite (тесты) — внешняя FTS5-таблица с триггерами.
+# Колонка не маппится в ORM, чтобы не загружать tsvector вместе с товаром.
+# В рабочей БД структура создаётся миграцией, события нужны для Base.metadata.create_all.
+_search_ddl = {
+    'postgresql': [
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+        "name, description, content='products', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+        "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    ],
+}
+
+for _dialect, _statements in _search_ddl.items():
+    for _statement in _statements:
+        event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
+event.listen(Product.__table__, 'after_drop', DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect='sqlite'))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Index, Integer, String, Boolean, Float, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -27,5 +27,12 @@ class Review(Base):
     grade = Column(Float)
     is_active = Column(Boolean, default=True)
 
+    # Один отзыв пользователя на товар; вставка опирается на индекс через ON CONFLICT DO NOTHING.
+    # Лента отзывов товара (product_id, is_active, новые первыми) — диапазон одного индекса.
+    __table_args__ = (
+        Index('uq_reviews_user_product', 'user_id', 'product_id', unique=True),
+        Index('ix_reviews_product_feed', product_id, is_active, id.desc()),
+    )
+
 
 
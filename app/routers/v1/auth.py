@@ -1,10 +1,9 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, update
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 import jwt
 from jwt import PyJWTError
@@ -13,13 +12,14 @@ from app.models.user import User
 from app.schemas import CreateUser
 from app.backend.db_depends import get_db
 from app.core.settings import settings
+from app.services.passwords import password_hasher
+from app.services.tokens import token_key, token_revocations, verified_tokens
 
 
 
 ALGORITHM = 'HS256'
 
 router = APIRouter(prefix='/auth', tags=['auth'])
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 
@@ -31,13 +31,16 @@ async def create_access_token(
         is_customer: bool,
         expires_delta: datetime
 ):
+    issued_at = datetime.now(timezone.utc)
     payload = {
         'sub': username,
         'id': user_id,
         'is_admin': is_admin,
         'is_supplier': is_supplier,
         'is_customer': is_customer,
-        'exp': expires_delta + datetime.now(timezone.utc)
+        # Время выпуска с долями секунды: сверяется с моментом отзыва токенов пользователя.
+        'iat': round(issued_at.timestamp(), 6),
+        'exp': expires_delta + issued_at
     }
 
     # Преобразование datetime в timestamp (количество секунд с начала эпохи)
@@ -45,6 +48,25 @@ async def create_access_token(
     return jwt.encode(payload, settings.secret_key, algorithm=ALGORITHM)
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+    # Подпись и claims проверяются один раз на токен; дальше — из LRU до истечения exp.
+    key = token_key(token)
+    cached = verified_tokens.get(key)
+    if cached is None:
+        cached = _verify_token(token)
+        verified_tokens.set(key, cached, cached[2] - datetime.now(timezone.utc).timestamp())
+    user, issued_at, _ = cached
+    # Смена ролей и удаление пользователя отзывают его токены без обращения к БД.
+    if token_revocations.is_revoked(user['id'], issued_at):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Token has been revoked'
+        )
+    return dict(user)
+
+
+def _verify_token(token: str) -> tuple[dict, float | None, int]:
+    """Декодируем токен и проверяем claims: (пользователь, iat, exp)."""
+
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
         username: str | None = payload.get('sub')
@@ -77,13 +99,14 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail='Token has expired'
             )
-        return {
+        user = {
             'username': username,
             'id': user_id,
             'is_admin': is_admin,
             'is_supplier': is_supplier,
             'is_customer': is_customer
         }
+        return user, payload.get('iat'), expire
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -102,7 +125,7 @@ async def create_user(db: Annotated[AsyncSession, Depends(get_db)], create_user:
         last_name=create_user.last_name,
         username=create_user.username,
         email=create_user.email,
-        hashed_password=bcrypt_context.hash(create_user.password)
+        hashed_password=await password_hasher.hash(create_user.password)
         )
     )
     await db.commit()
@@ -113,12 +136,17 @@ async def create_user(db: Annotated[AsyncSession, Depends(get_db)], create_user:
 
 async def authenticate_user(db: Annotated[AsyncSession, Depends(get_db)], username: str, password: str):
     user = await db.scalar(select(User).where(User.username == username))
-    if not user or not bcrypt_context.verify(password, user.hashed_password) or user.is_active == False:
+    valid, new_hash = (False, None) if not user else await password_hasher.verify_and_update(password, user.hashed_password)
+    if not user or not valid or user.is_active == False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Invalid authentication credentials',
             headers={'WWW-Authenticate': 'Bearer'}
         )
+    if new_hash is not None:
+        # Хэш со старой стоимостью bcrypt прозрачно заменяется при успешном входе.
+        await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
     return user
 
 @router.post('/token')
@@ -130,7 +158,7 @@ async def login(db: Annotated[AsyncSession, Depends(get_db)], form_data: Annotat
         user.is_admin,
         user.is_supplier,
         user.is_customer,
-        expires_delta=timedelta(minutes=15)
+        expires_delta=timedelta(seconds=settings.access_token_ttl)
     )
     return {
         'access_token': token,
@@ -139,4 +167,15 @@ async def login(db: Annotated[AsyncSession, Depends(get_db)], form_data: Annotat
 
 @router.get('/read_current_user')
 async def read_current_user(user: str = Depends(get_current_user)):
-    return user
\ No newline at end of file
+    return user
+
+
+# Метрики пула хэширования паролей (ожидание свободного потока). Разрешен доступ только администраторам.
+@router.get('/password_hashing')
+async def password_hashing_stats(user: Annotated[dict, Depends(get_current_user)]):
+    if not user.get('is_admin'):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='You must be admin user for this'
+        )
+    return password_hasher.stats()
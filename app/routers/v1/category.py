@@ -1,22 +1,45 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Header, Response, status, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import insert, select
 from typing import Annotated
 from slugify import slugify
 
 from app.routers.v1.auth import get_current_user
-from app.backend.db_depends import get_db
+from app.backend.db_depends import get_db, get_read_db
 from app.schemas import CategoryRead, CreateCategory, MessageResponse
 from app.models import Category
+from app.services.category_tree import category_tree
+from app.services.etag import etag_matches, make_etag, not_modified
+from app.services.query_cache import query_cache
 
 router = APIRouter(prefix="/category", tags=["category"])
 
 
 # Получение всех категорий.
 @router.get("/", response_model=list[CategoryRead])
-async def get_all_categories(db: Annotated[AsyncSession, Depends(get_db)]):
-    categories = await db.scalars(select(Category).where(Category.is_active == True))
-    all_categories = categories.all()
+async def get_all_categories(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        response: Response,
+        if_none_match: str | None = Header(None),
+):
+    def categories_etag(rows) -> str:
+        return make_etag("categories", [(row["id"], row["version"]) for row in rows])
+
+    # Справочник категорий меняется редко, поэтому читаем его через кэш запросов.
+    if if_none_match:
+        versions = await query_cache.fetch(
+            db,
+            select(Category.id, Category.version).where(Category.is_active == True).order_by(Category.id),
+        )
+        etag = categories_etag(versions)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    all_categories = await query_cache.fetch(
+        db,
+        select(*Category.__table__.c).where(Category.is_active == True).order_by(Category.id),
+    )
+    response.headers["ETag"] = categories_etag(all_categories)
     return [CategoryRead.model_validate(category) for category in all_categories]
 
 # Создание категории. Разрешено только для админа.
@@ -33,6 +56,7 @@ async def create_category(
             slug=slugify(create_category.name))
         )
         await db.commit()
+        category_tree.invalidate()
         return MessageResponse(
             status_code=status.HTTP_201_CREATED,
             transaction="Success"
@@ -63,6 +87,7 @@ async def put_category(
             category.slug = slugify(update_category.name)
         
             await db.commit()
+            category_tree.invalidate()
             return MessageResponse(
                 status_code=status.HTTP_200_OK,
                 transaction="Category update is successful"
@@ -89,6 +114,7 @@ async def delete_category(
         else:
             category.is_active = False
             await db.commit()
+            category_tree.invalidate()
             return MessageResponse(
                 status_code=status.HTTP_200_OK,
                 transaction="Category delete is successful"
@@ -0,0 +1,37 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.backend.db import engine, replica_engine
+from app.backend.pool import pool_status
+from app.backend.replica import replica_health
+from app.routers.v1.auth import get_current_user
+
+router = APIRouter(prefix='/metrics', tags=['metrics'])
+
+
+# Состояние пула соединений воркера (занято, простаивает, overflow, ожидание соединения).
+# Разрешен доступ только администраторам.
+@router.get('/db_pool')
+async def db_pool_metrics(get_user: Annotated[dict, Depends(get_current_user)]):
+    if not get_user.get('is_admin'):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='You must be admin user for this'
+        )
+    return pool_status(engine.pool)
+
+
+# Состояние реплики для чтения: доступность, последнее измеренное отставание, чтения из реплики и основной базы.
+# Разрешен доступ только администраторам.
+@router.get('/db_replica')
+async def db_replica_metrics(get_user: Annotated[dict, Depends(get_current_user)]):
+    if not get_user.get('is_admin'):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='You must be admin user for this'
+        )
+    replica = replica_health.stats()
+    if replica_engine is not None:
+        replica["pool"] = pool_status(replica_engine.pool)
+    return replica
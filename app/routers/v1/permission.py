@@ -8,6 +8,7 @@ from app.backend.db_depends import get_db
 from app.models.user import User
 from app.routers.v1.auth import get_current_user
 from app.schemas import MessageResponse
+from app.services.tokens import token_revocations
 
 router = APIRouter(prefix='/permission', tags=['permission'])
 
@@ -29,6 +30,8 @@ async def supplier_permission(
         if user.is_supplier:
             await db.execute(update(User).where(User.id == user_id).values(is_supplier=False, is_customer=True))
             await db.commit()
+            # Токены со старыми ролями перестают приниматься сразу, а не по истечении срока.
+            await token_revocations.revoke_user(user_id)
             return MessageResponse(
                 status_code=status.HTTP_200_OK,
                 transaction='User is no longer supplier'
@@ -36,6 +39,7 @@ async def supplier_permission(
         else:
             await db.execute(update(User).where(User.id == user_id).values(is_supplier=True, is_customer=False))
             await db.commit()
+            await token_revocations.revoke_user(user_id)
             return MessageResponse(
                 status_code=status.HTTP_200_OK,
                 transaction='User is supplier now'
@@ -67,6 +71,7 @@ async def delete(
         else:
             user.is_active = False
             await db.commit()
+            await token_revocations.revoke_user(user_id)
             return MessageResponse(
                 status_code=status.HTTP_200_OK,
                 transaction='User is deleted successfully'
@@ -1,29 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import asyncio
+from enum import Enum
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, insert, or_, select
+from sqlalchemy import insert, select
 from typing import Annotated
 from slugify import slugify
 
 from app.routers.v1.auth import get_current_user
-from app.schemas import CreateProduct, MessageResponse, ProductListResponse, ProductRead
-from app.backend.db_depends import get_db
+from app.schemas import (
+    CreateProduct,
+    MessageResponse,
+    ProductBatchRequest,
+    ProductBatchResponse,
+    ProductFacets,
+    ProductImportResponse,
+    ProductListResponse,
+    ProductRead,
+    ProductSuggestion,
+    StockLevelRead,
+    StockRequest,
+    StockResponse,
+)
+from app.backend.db import session_maker_for
+from app.backend.db_depends import get_db, get_read_db
 from app.models import Product, Category
+from app.models.products import LISTED_PRODUCT
+from app.services.catalog_export import stream_ndjson
+from app.services.category_tree import category_tree
+from app.services.counting import CountStrategy, clear_count_cache, count_rows
+from app.services.etag import etag_matches, make_etag, not_modified
+from app.services.facets import product_facets
+from app.services.pagination import (
+    InvalidCursorError,
+    SortKey,
+    SortOrder,
+    decode_cursor,
+    encode_cursor,
+)
+from app.services.product_import import ImportFormat, ProductImport, parse_records
+from app.services.query_cache import query_cache
+from app.services.search import product_search
+from app.services.serialization import json_response, project, sparse_fields
+from app.services.stock import (
+    ProductNotFoundError,
+    StockError,
+    merge_quantities,
+    release_stock,
+    reserve_stock,
+)
+from app.services.suggest import product_suggestions
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 
-# Метод получения всех товаров. Разрешен доступ всем.
-@router.get("/", response_model=ProductListResponse)
-async def get_all_products(
-        db: Annotated[AsyncSession, Depends(get_db)],
-        limit: int = Query(10, ge=1, le=100, description="Количество элементов на странице"),
-        offset: int = Query(0, ge=0, description="Смещение выборки для пагинации"),
-        search: str | None = Query(None, description="Поиск по названию и описанию товара"),
-        min_price: int | None = Query(None, ge=0, description="Минимальная цена"),
-        max_price: int | None = Query(None, ge=0, description="Максимальная цена"),
-):
-    """Возвращаем список товаров с учётом фильтров и пагинации."""
+class ProductSort(str, Enum):
+    """Сортировки списков товаров (query-параметр ``sort``)."""
+
+    id = "id"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
+    rating = "rating"
+    newest = "newest"
+
+
+# Порядок сортировки списков товаров: id уникален, поэтому подходит для keyset-пагинации.
+PRODUCT_SORT = SortOrder("id", (SortKey(Product.id),))
+
+# Каждая сортировка заканчивается id, а направления ключей совпадают: курсор сравнивает кортеж,
+# а страницу отдаёт частичный индекс ix_products_listed_* (прямым или обратным сканированием).
+# Товары не хранят дату создания, поэтому «новые» — по убыванию монотонного id.
+PRODUCT_SORTS = {
+    ProductSort.id: PRODUCT_SORT,
+    ProductSort.price_asc: SortOrder("price_asc", (SortKey(Product.price), SortKey(Product.id))),
+    ProductSort.price_desc: SortOrder(
+        "price_desc", (SortKey(Product.price, descending=True), SortKey(Product.id, descending=True)),
+    ),
+    ProductSort.rating: SortOrder(
+        "rating", (SortKey(Product.rating, descending=True), SortKey(Product.id, descending=True)),
+    ),
+    ProductSort.newest: SortOrder("newest", (SortKey(Product.id, descending=True),)),
+}
 
+# Поля публичной схемы ProductRead; клиент может сузить их параметром fields=.
+PRODUCT_FIELDS = tuple(ProductRead.model_fields)
+product_fields = sparse_fields(PRODUCT_FIELDS)
+
+
+def _product_columns(fields: tuple[str, ...]) -> tuple:
+    """Колонки для выборки строк (без ORM-объектов): запрошенные поля плюс id и version для ETag."""
+
+    extra = [Product.__table__.c[name] for name in fields if name not in ("id", "version")]
+    return (Product.id, Product.version, *extra)
+
+
+def _validate_price_range(min_price: int | None, max_price: int | None) -> None:
     # Валидируем диапазон цен, чтобы не строить заведомо пустой запрос к БД.
     if (
         min_price is not None
@@ -35,41 +107,193 @@ async def get_all_products(
             detail="min_price must be less than or equal to max_price",
         )
 
-    filters = [Product.is_active == True, Product.stock > 0]
 
-    # Добавляем условия поиска по тексту, если передан параметр.
+def _product_filters(
+        db: AsyncSession,
+        search: str | None,
+        min_price: int | None,
+        max_price: int | None,
+        sort: ProductSort | None = None,
+) -> tuple[list, SortOrder]:
+    """Собираем фильтры списка товаров и порядок сортировки для них.
+
+    Без явного ``sort`` поиск упорядочивается по релевантности, остальные списки — по id.
+    """
+
+    filters = list(LISTED_PRODUCT)
+    order = PRODUCT_SORTS[sort or ProductSort.id]
+
+    # Полнотекстовый поиск: при заданном запросе выдача упорядочена по релевантности.
     if search:
-        search_pattern = f"%{search}%"
-        filters.append(or_(
-            Product.name.ilike(search_pattern),
-            Product.description.ilike(search_pattern)
-        ))
+        text_search = product_search(db.bind.dialect.name, search)
+        filters.append(text_search.condition)
+        if sort is None:
+            order = SortOrder("relevance", (SortKey(text_search.rank, descending=True), SortKey(Product.id)))
 
     # Ограничения по цене задаются только если пользователь их указал.
     if min_price is not None:
         filters.append(Product.price >= min_price)
     if max_price is not None:
         filters.append(Product.price <= max_price)
+    # Сравнение курсора с NULL ложно: товар без цены обрывал бы пагинацию по цене.
+    # Как и фильтры по цене, сортировки по цене такие товары не показывают.
+    if sort in (ProductSort.price_asc, ProductSort.price_desc):
+        filters.append(Product.price.is_not(None))
+    return filters, order
+
+
+async def _fetch_rows(db: AsyncSession, stmt) -> list:
+    result = await db.execute(stmt)
+    return result.mappings().all()
+
+
+async def _no_facets() -> None:
+    return None
+
+
+def _page_result(
+        order: SortOrder,
+        rows: list,
+        *,
+        limit: int,
+        offset: int,
+        total: int | None,
+        fields: tuple[str, ...],
+        facets: ProductFacets | None = None,
+):
+    """Разбираем limit + 1 строк на страницу, признак продолжения, курсор и ETag."""
 
-    total_stmt = select(func.count()).select_from(Product).where(*filters)
-    total = await db.scalar(total_stmt)
+    page = rows[:limit]
+    has_more = len(rows) > limit
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(order, order.values_of(page[-1]))
+    # Тело ответа целиком определяется версиями строк страницы и метаданными пагинации.
+    etag = make_etag(
+        "products", fields, total, limit, offset, has_more, next_cursor,
+        [(row["id"], row["version"]) for row in page],
+        facets.model_dump() if facets is not None else None,
+    )
+    return page, has_more, next_cursor, etag
+
+
+async def _product_page(
+        db: AsyncSession,
+        filters: list,
+        order: SortOrder,
+        *,
+        limit: int,
+        offset: int,
+        cursor: str | None,
+        count: CountStrategy,
+        fields: tuple[str, ...] = PRODUCT_FIELDS,
+        facets: bool = False,
+        if_none_match: str | None = None,
+        cacheable: bool = False,
+) -> Response:
+    """Выбираем страницу товаров в режиме offset или cursor.
+
+    ``cacheable`` включает кэш результатов запросов для страницы и точного total —
+    используется для первой страницы без пользовательских фильтров.
+    ``fields`` — поля элементов; в SQL выбираются только их колонки.
+    ``facets`` добавляет к странице фасеты по тому же набору фильтров.
+    Если клиент прислал ``If-None-Match``, сначала выбираются только ``id`` и ``version``
+    строк страницы, и при совпадении ETag возвращается 304 без загрузки полных строк.
+    """
+
+    if cursor is not None and offset:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="cursor and offset cannot be combined",
+        )
 
-    products_stmt = (
-        select(Product)
-        .where(*filters)
-        .order_by(Product.id)
-        .limit(limit)
-        .offset(offset)
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(order, cursor)
+        except InvalidCursorError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(exc),
+            )
+
+    def page_stmt(*columns):
+        # Запрашиваем на одну строку больше, чтобы узнать, есть ли следующая страница.
+        stmt = (
+            select(*columns, *order.columns())
+            .where(*filters)
+            .order_by(*order.order_by())
+            .limit(limit + 1)
+        )
+        return stmt.where(order.seek(after)) if after is not None else stmt.offset(offset)
+
+    fetch = query_cache.fetch if cacheable else _fetch_rows
+    # Подсчёт и фасеты идут в отдельных сессиях параллельно с выборкой страницы, в той же базе, что и она.
+    session_factory = session_maker_for(db)
+    aggregates = asyncio.gather(
+        count_rows(select(Product.id).where(*filters), count, read_through=cacheable, session_factory=session_factory),
+        product_facets(filters, session_factory=session_factory) if facets else _no_facets(),
     )
-    products = await db.scalars(products_stmt)
 
-    items = [ProductRead.model_validate(product) for product in products.all()]
+    if if_none_match:
+        (total, page_facets), rows = await asyncio.gather(
+            aggregates, fetch(db, page_stmt(Product.id, Product.version)),
+        )
+        etag = _page_result(
+            order, rows, limit=limit, offset=offset, total=total, fields=fields, facets=page_facets,
+        )[-1]
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        rows = await fetch(db, page_stmt(*_product_columns(fields)))
+    else:
+        (total, page_facets), rows = await asyncio.gather(
+            aggregates, fetch(db, page_stmt(*_product_columns(fields))),
+        )
+
+    page, has_more, next_cursor, etag = _page_result(
+        order, rows, limit=limit, offset=offset, total=total, fields=fields, facets=page_facets,
+    )
 
-    return ProductListResponse(
-        items=items,
-        total=total or 0,
-        limit=limit,
-        offset=offset,
+    # Строки сериализуются сразу в JSON-байты в форме ProductListResponse, без валидации по элементам.
+    return json_response(
+        {
+            "items": project(page, fields),
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            "facets": page_facets.model_dump() if page_facets is not None else None,
+        },
+        headers={"ETag": etag},
+    )
+
+
+# Метод получения всех товаров. Разрешен доступ всем.
+@router.get("/", response_model=ProductListResponse)
+async def get_all_products(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        limit: int = Query(10, ge=1, le=100, description="Количество элементов на странице"),
+        offset: int = Query(0, ge=0, description="Смещение выборки для пагинации"),
+        cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor из прошлого ответа)"),
+        search: str | None = Query(None, description="Поиск по названию и описанию товара"),
+        min_price: int | None = Query(None, ge=0, description="Минимальная цена"),
+        max_price: int | None = Query(None, ge=0, description="Максимальная цена"),
+        sort: ProductSort | None = Query(None, description="Сортировка: id, price_asc, price_desc, rating, newest"),
+        count: CountStrategy = Query(CountStrategy.exact, description="Способ подсчёта total: exact, estimated, cached, none"),
+        facets: bool = Query(False, description="Добавить фасеты: счётчики по категориям и гистограмму цен"),
+        fields: Annotated[tuple[str, ...], Depends(product_fields)] = PRODUCT_FIELDS,
+        if_none_match: str | None = Header(None),
+):
+    """Возвращаем список товаров с учётом фильтров и пагинации."""
+
+    _validate_price_range(min_price, max_price)
+    filters, order = _product_filters(db, search, min_price, max_price, sort)
+    # Первая страница каталога без фильтров — самый частый запрос, её отдаём через кэш.
+    cacheable = cursor is None and offset == 0 and not search and min_price is None and max_price is None
+    return await _product_page(
+        db, filters, order, limit=limit, offset=offset, cursor=cursor, count=count,
+        fields=fields, facets=facets, if_none_match=if_none_match, cacheable=cacheable,
     )
 
 # Метод создания товара. Разрешен доступ администраторам и продавцам.
@@ -87,7 +311,8 @@ async def create_product(
                 detail="Category not found!"
             )
         else:
-            await db.execute(insert(Product).values(
+            slug = slugify(create_product.name)
+            product_id = await db.scalar(insert(Product).values(
                 name=create_product.name,
                 description=create_product.description,
                 price=create_product.price,
@@ -95,10 +320,12 @@ async def create_product(
                 stock=create_product.stock,
                 category_id=create_product.category,
                 supplier_id=get_user.get('id'),
-                slug=slugify(create_product.name),
-                is_active=True)
+                slug=slug,
+                is_active=True).returning(Product.id)
             )
             await db.commit()
+            if create_product.stock > 0:
+                product_suggestions.add(product_id, create_product.name, slug)
             return MessageResponse(
                 status_code=status.HTTP_201_CREATED,
                 transaction="Product has been created successfully!"
@@ -109,94 +336,226 @@ async def create_product(
             detail="You have not enough permission to use post-method"
         )
 
+# Массовый импорт товаров из NDJSON или CSV. Разрешен доступ админу и поставщику.
+# Тело читается потоком; формат берётся из параметра format или из Content-Type.
+@router.post("/import", response_model=ProductImportResponse)
+async def import_products(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        request: Request,
+        get_user: Annotated[dict, Depends(get_current_user)],
+        format: ImportFormat | None = Query(None, description="Формат тела: ndjson или csv"),
+):
+    if get_user.get('is_admin') or get_user['is_supplier']:
+        if format is None:
+            content_type = request.headers.get("content-type", "")
+            format = ImportFormat.csv if "csv" in content_type else ImportFormat.ndjson
+        records = parse_records(format, request.stream())
+        summary = await ProductImport(db, supplier_id=get_user.get('id')).run(records)
+        if summary.created:
+            clear_count_cache()
+        return summary
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You have not enough permission to use post-method"
+        )
+
+# Автодополнение по названию товара из in-memory индекса, без обращения к БД. Разрешен доступ всем.
+# Объявлен до /{category_slug}, иначе путь /suggest был бы воспринят как слаг категории.
+@router.get("/suggest", response_model=list[ProductSuggestion])
+async def suggest_products(
+        q: str = Query(..., min_length=1, max_length=100, description="Начало названия товара"),
+        limit: int = Query(10, ge=1, le=50, description="Количество подсказок"),
+):
+    # Холодный старт: индекс ещё не построен (например, прогрев при запуске не удался).
+    if not product_suggestions.loaded:
+        await product_suggestions.refresh()
+    else:
+        product_suggestions.schedule_refresh()
+
+    return [
+        ProductSuggestion(name=name, slug=slug)
+        for name, slug in product_suggestions.suggest(q, limit)
+    ]
+
+# Выгрузка всего каталога одним потоком NDJSON (по товару в строке) с фильтрами как у get_all_products.
+# Разрешен доступ всем. Объявлен до /{category_slug}.
+@router.get("/export")
+async def export_products(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        request: Request,
+        search: str | None = Query(None, description="Поиск по названию и описанию товара"),
+        min_price: int | None = Query(None, ge=0, description="Минимальная цена"),
+        max_price: int | None = Query(None, ge=0, description="Максимальная цена"),
+        gzip: bool | None = Query(None, description="Сжимать ответ gzip; по умолчанию — по Accept-Encoding"),
+        fields: Annotated[tuple[str, ...], Depends(product_fields)] = PRODUCT_FIELDS,
+):
+    _validate_price_range(min_price, max_price)
+    filters, _ = _product_filters(db, search, min_price, max_price)
+    # Для выгрузки релевантность не нужна: стабильный порядок по id.
+    # Сессия запроса закрывается до отправки тела, поэтому поток читает в своей сессии.
+    columns = [Product.__table__.c[name] for name in fields]
+    stmt = select(*columns).where(*filters).order_by(*PRODUCT_SORT.order_by())
+
+    if gzip is None:
+        gzip = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"Content-Disposition": 'attachment; filename="products.ndjson"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream_ndjson(stmt, compress=gzip, session_factory=session_maker_for(db)),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
 # Метод получения товаров определенной категории. Разрешен доступ всем.
 @router.get("/{category_slug}", response_model=ProductListResponse)
 async def product_by_category(
-        db: Annotated[AsyncSession, Depends(get_db)],
+        db: Annotated[AsyncSession, Depends(get_read_db)],
         category_slug: str,
         limit: int = Query(10, ge=1, le=100, description="Количество элементов на странице"),
         offset: int = Query(0, ge=0, description="Смещение выборки для пагинации"),
+        cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor из прошлого ответа)"),
         search: str | None = Query(None, description="Поиск по названию и описанию товара"),
         min_price: int | None = Query(None, ge=0, description="Минимальная цена"),
         max_price: int | None = Query(None, ge=0, description="Максимальная цена"),
+        sort: ProductSort | None = Query(None, description="Сортировка: id, price_asc, price_desc, rating, newest"),
+        count: CountStrategy = Query(CountStrategy.exact, description="Способ подсчёта total: exact, estimated, cached, none"),
+        facets: bool = Query(False, description="Добавить фасеты: счётчики по категориям и гистограмму цен"),
+        fields: Annotated[tuple[str, ...], Depends(product_fields)] = PRODUCT_FIELDS,
+        if_none_match: str | None = Header(None),
 ):
-    category = await db.scalar(select(Category).where(Category.slug == category_slug, Category.is_active == True))
-    if category is None:
+    # Категория и всё её поддерево берутся из кэша дерева категорий без запроса к БД.
+    categories_and_subcategories = await category_tree.subtree_ids(db, category_slug)
+    if categories_and_subcategories is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Category not found!"
         )
     else:
-        if (
-            min_price is not None
-            and max_price is not None
-            and min_price > max_price
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="min_price must be less than or equal to max_price",
-            )
-
-        subcategories_result = await db.scalars(select(Category).where(Category.parent_id == category.id))
-        subcategories = subcategories_result.all()
-        categories_and_subcategories = [category.id] + [i.id for i in subcategories]
-
-        filters = [
-            Product.category_id.in_(categories_and_subcategories),
-            Product.is_active == True,
-            Product.stock > 0,
-        ]
+        _validate_price_range(min_price, max_price)
 
         # Переиспользуем логику фильтрации по тексту и диапазону цен.
-        if search:
-            search_pattern = f"%{search}%"
-            filters.append(or_(
-                Product.name.ilike(search_pattern),
-                Product.description.ilike(search_pattern)
-            ))
-        if min_price is not None:
-            filters.append(Product.price >= min_price)
-        if max_price is not None:
-            filters.append(Product.price <= max_price)
-
-        total_stmt = select(func.count()).select_from(Product).where(*filters)
-        total = await db.scalar(total_stmt)
-
-        products_stmt = (
-            select(Product)
-            .where(*filters)
-            .order_by(Product.id)
-            .limit(limit)
-            .offset(offset)
-        )
-        products = await db.scalars(products_stmt)
+        filters, order = _product_filters(db, search, min_price, max_price, sort)
+        filters.append(Product.category_id.in_(sorted(categories_and_subcategories)))
 
-        items = [ProductRead.model_validate(product) for product in products.all()]
-
-        return ProductListResponse(
-            items=items,
-            total=total or 0,
-            limit=limit,
-            offset=offset,
+        return await _product_page(
+            db, filters, order, limit=limit, offset=offset, cursor=cursor, count=count,
+            fields=fields, facets=facets, if_none_match=if_none_match,
         )
 
 # Метод получения детальной информации о товаре. Разрешен доступ всем.
 @router.get("/detail/{product_slug}", response_model=ProductRead)
-async def product_detail(db: Annotated[AsyncSession, Depends(get_db)], product_slug: str):
-    product = await db.scalar(
-        select(Product).where(
-            Product.slug == product_slug,
-            Product.is_active == True,
-            Product.stock > 0
-        )
-    )
-    if product is None:
+async def product_detail(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        product_slug: str,
+        fields: Annotated[tuple[str, ...], Depends(product_fields)] = PRODUCT_FIELDS,
+        if_none_match: str | None = Header(None),
+):
+    conditions = (Product.slug == product_slug, *LISTED_PRODUCT)
+    # Клиент с ETag проверяется по версии строки без загрузки и сериализации карточки.
+    if if_none_match:
+        versions = await query_cache.fetch(db, select(Product.id, Product.version).where(*conditions))
+        if versions:
+            etag = make_etag("product", fields, versions[0]["id"], versions[0]["version"])
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
+    rows = await query_cache.fetch(db, select(*_product_columns(fields)).where(*conditions))
+    if not rows:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found!"
         )
     else:
-        return ProductRead.model_validate(product)
+        etag = make_etag("product", fields, rows[0]["id"], rows[0]["version"])
+        return json_response(project(rows, fields)[0], headers={"ETag": etag})
+
+# Пакетное получение карточек (корзина, избранное) одним запросом IN (...). Разрешен доступ всем.
+# Правила видимости те же, что у product_detail; недоступные товары помечаются found = false.
+# Запрос только читает, поэтому, несмотря на POST, обслуживается репликой.
+@router.post("/batch", response_model=ProductBatchResponse)
+async def products_batch(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        batch: ProductBatchRequest,
+        fields: Annotated[tuple[str, ...], Depends(product_fields)] = PRODUCT_FIELDS,
+):
+    if (batch.slugs is None) == (batch.ids is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide either slugs or ids",
+        )
+    key_column, keys = (Product.slug, batch.slugs) if batch.slugs is not None else (Product.id, batch.ids)
+
+    result = await db.execute(
+        select(key_column.label("batch_key"), *_product_columns(fields))
+        .where(key_column.in_(set(keys)), *LISTED_PRODUCT)
+    )
+    found = {row["batch_key"]: row for row in result.mappings()}
+
+    items = []
+    for key in keys:
+        row = found.get(key)
+        product = project([row], fields)[0] if row is not None else None
+        items.append({"key": key, "found": row is not None, "product": product})
+    return json_response({"items": items})
+
+# Атомарное резервирование остатка при оформлении заказа. Разрешен доступ только админу:
+# резерв не привязан к заказу и не истекает, поэтому покупатель мог бы снять товар с витрины.
+# Все позиции резервируются в одной транзакции: при нехватке любой из них ничего не списывается.
+@router.post("/stock/reserve", response_model=StockResponse)
+async def reserve_products_stock(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        stock_request: StockRequest,
+        get_user: Annotated[dict, Depends(get_current_user)]
+):
+    if not get_user.get('is_admin'):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You have not enough permission to reserve stock"
+        )
+    try:
+        levels = await reserve_stock(db, [(item.product_id, item.quantity) for item in stock_request.items])
+    except StockError as exc:
+        await db.rollback()
+        raise HTTPException(
+            status_code=(
+                status.HTTP_404_NOT_FOUND if isinstance(exc, ProductNotFoundError) else status.HTTP_409_CONFLICT
+            ),
+            detail=str(exc),
+        )
+    await db.commit()
+    # Распроданные товары пропадают из выдачи, а значит и из автодополнения.
+    for level in levels:
+        if level.stock <= 0:
+            product_suggestions.discard(level.product_id)
+    return StockResponse(items=[StockLevelRead(product_id=level.product_id, stock=level.stock) for level in levels])
+
+# Возврат зарезервированного остатка (отмена или истечение заказа). Разрешен доступ только админу.
+@router.post("/stock/release", response_model=StockResponse)
+async def release_products_stock(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        stock_request: StockRequest,
+        get_user: Annotated[dict, Depends(get_current_user)]
+):
+    if not get_user.get('is_admin'):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You have not enough permission to release stock"
+        )
+    items = [(item.product_id, item.quantity) for item in stock_request.items]
+    try:
+        levels = await release_stock(db, items)
+    except StockError as exc:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+    await db.commit()
+    # Товар, который был распродан, снова появляется в автодополнении.
+    released = merge_quantities(items)
+    for level in levels:
+        if 0 < level.stock <= released[level.product_id]:
+            product_suggestions.add(level.product_id, level.name, level.slug)
+    return StockResponse(items=[StockLevelRead(product_id=level.product_id, stock=level.stock) for level in levels])
 
 # Метод изменения товара. Разрешен доступ администраторам и продавцам, которые добавили этот товар.
 @router.put("/{product_slug}", response_model=MessageResponse)
@@ -231,6 +590,10 @@ async def update_product(
                 product.is_active = True
 
                 await db.commit()
+                if product.stock > 0:
+                    product_suggestions.add(product.id, product.name, product.slug)
+                else:
+                    product_suggestions.discard(product.id)
                 return MessageResponse(
                     status_code=status.HTTP_200_OK,
                     transaction="Product has been updated successfully!"
@@ -263,6 +626,7 @@ async def delete_product(
         if get_user.get('id') == product.supplier_id or get_user.get('is_admin'):
             product.is_active = False
             await db.commit()
+            product_suggestions.discard(product.id)
             return MessageResponse(
                 status_code=status.HTTP_200_OK,
                 transaction="Product has been deleted successfully!"
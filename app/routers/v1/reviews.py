@@ -1,26 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, insert, select, update
+from sqlalchemy import false, select
 from typing import Annotated, Any
 
 from app.routers.v1.auth import get_current_user
-from app.backend.db_depends import get_db
+from app.backend.db import session_maker_for
+from app.backend.db_depends import get_db, get_read_db
 from app.models.reviews import Review
 from app.models.products import Product
-from app.schemas import CreateReview, MessageResponse, ReviewListResponse, ReviewRead
+from app.schemas import CreateReview, MessageResponse, ReviewListResponse, ReviewRead, ReviewSummary
+from app.services.counting import CountStrategy, count_rows
+from app.services.pagination import InvalidCursorError, SortKey, SortOrder, decode_cursor, encode_cursor
+from app.services.etag import etag_matches, make_etag, not_modified
+from app.services.review_aggregates import (
+    STARS,
+    add_review_with_aggregates,
+    deactivate_review_with_aggregates,
+    stars_column,
+)
+from app.services.review_queue import PendingReview, ReviewQueueFull, review_queue
+from app.services.serialization import json_response, project, sparse_fields
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
 
+# Поля ReviewRead; списки читают их строками без ORM-объектов, клиент может сузить их через fields=.
+REVIEW_FIELDS = tuple(ReviewRead.model_fields)
+review_fields = sparse_fields(REVIEW_FIELDS)
+
+
+# Ленты отзывов — новые первыми; id уникален, поэтому подходит для keyset-пагинации.
+REVIEW_SORT = SortOrder("review_id_desc", (SortKey(Review.id, descending=True),))
+
+
+def _review_columns(fields: tuple[str, ...]) -> tuple:
+    return tuple(Review.__table__.c[name] for name in fields)
+
+
+async def _review_page(
+        db: AsyncSession,
+        reviews_stmt,
+        total_stmt,
+        *,
+        limit: int,
+        offset: int,
+        cursor: str | None,
+        count: CountStrategy,
+        fields: tuple[str, ...] = REVIEW_FIELDS,
+) -> Response:
+    """Выбираем страницу отзывов (limit + 1 строк) в режиме offset или cursor и параллельно считаем total.
+
+    ``reviews_stmt`` — выборка колонок с фильтрами; порядок, лимит и смещение
+    (или условие курсора) добавляются здесь. Строки сериализуются сразу
+    в JSON-байты в форме ``ReviewListResponse``.
+    """
+
+    if cursor is not None and offset:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="cursor and offset cannot be combined",
+        )
+    reviews_stmt = (
+        reviews_stmt
+        .add_columns(*REVIEW_SORT.columns())
+        .order_by(*REVIEW_SORT.order_by())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        try:
+            reviews_stmt = reviews_stmt.where(REVIEW_SORT.seek(decode_cursor(REVIEW_SORT, cursor)))
+        except InvalidCursorError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(exc),
+            )
+    else:
+        reviews_stmt = reviews_stmt.offset(offset)
+
+    total, result = await asyncio.gather(
+        count_rows(total_stmt, count, session_factory=session_maker_for(db)),
+        db.execute(reviews_stmt),
+    )
+    reviews = result.mappings().all()
+    page = reviews[:limit]
+    has_more = len(reviews) > limit
+
+    return json_response({
+        "items": project(page, fields),
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(REVIEW_SORT, REVIEW_SORT.values_of(page[-1])) if has_more else None,
+    })
+
+
 # Получение полного перечня отзывов. Разрешен доступ всем.
 @router.get("/", response_model=ReviewListResponse)
 async def all_reviews(
-        db: Annotated[AsyncSession, Depends(get_db)],
+        db: Annotated[AsyncSession, Depends(get_read_db)],
         limit: int = Query(10, ge=1, le=100, description="Количество отзывов на странице"),
         offset: int = Query(0, ge=0, description="Смещение выборки для пагинации"),
+        cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor из прошлого ответа)"),
         search: str | None = Query(None, description="Поиск по тексту отзыва"),
         min_price: int | None = Query(None, ge=0, description="Минимальная цена товара"),
         max_price: int | None = Query(None, ge=0, description="Максимальная цена товара"),
+        count: CountStrategy = Query(CountStrategy.exact, description="Способ подсчёта total: exact, estimated, cached, none"),
+        fields: Annotated[tuple[str, ...], Depends(review_fields)] = REVIEW_FIELDS,
 ):
     """Формируем список отзывов с учётом фильтров и пагинации."""
 
@@ -46,45 +134,35 @@ async def all_reviews(
     if max_price is not None:
         price_filters.append(Product.price <= max_price)
 
-    total_stmt = select(func.count()).select_from(Review).where(*review_filters)
-    reviews_stmt = select(Review).where(*review_filters)
+    total_stmt = select(Review.id).where(*review_filters)
+    reviews_stmt = select(*_review_columns(fields)).where(*review_filters)
 
     # Для фильтров по цене требуется присоединить таблицу товаров.
     if price_filters:
         total_stmt = total_stmt.join(Product, Review.product_id == Product.id).where(*price_filters)
         reviews_stmt = reviews_stmt.join(Product, Review.product_id == Product.id).where(*price_filters)
 
-    total = await db.scalar(total_stmt)
-
-    reviews_stmt = (
-        reviews_stmt
-        .order_by(Review.id.desc())
-        .limit(limit)
-        .offset(offset)
-    )
-    reviews = await db.scalars(reviews_stmt)
-
-    items = [ReviewRead.model_validate(review) for review in reviews.all()]
-
-    return ReviewListResponse(
-        items=items,
-        total=total or 0,
-        limit=limit,
-        offset=offset,
+    return await _review_page(
+        db, reviews_stmt, total_stmt, limit=limit, offset=offset, cursor=cursor, count=count, fields=fields,
     )
 
 # Получение отзывов по слагу товара. Разрешен доступ всем.
 @router.get("/{product_slug}", response_model=ReviewListResponse)
 async def products_reviews(
         product_slug: str,
-        db: Annotated[AsyncSession, Depends(get_db)],
+        db: Annotated[AsyncSession, Depends(get_read_db)],
         limit: int = Query(10, ge=1, le=100, description="Количество отзывов на странице"),
         offset: int = Query(0, ge=0, description="Смещение выборки для пагинации"),
+        cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor из прошлого ответа)"),
         search: str | None = Query(None, description="Поиск по тексту отзыва"),
         min_price: int | None = Query(None, ge=0, description="Минимальная цена товара"),
         max_price: int | None = Query(None, ge=0, description="Максимальная цена товара"),
+        count: CountStrategy = Query(CountStrategy.exact, description="Способ подсчёта total: exact, estimated, cached, none"),
+        fields: Annotated[tuple[str, ...], Depends(review_fields)] = REVIEW_FIELDS,
 ):
-    product = await db.scalar(select(Product).where(Product.slug == product_slug))
+    product = (await db.execute(
+        select(Product.id, Product.price).where(Product.slug == product_slug)
+    )).first()
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -101,37 +179,73 @@ async def products_reviews(
             detail="min_price must be less than or equal to max_price",
         )
 
-    # Быстрый выход: если цена товара не удовлетворяет фильтрам, отзывов не будет.
-    if min_price is not None and product.price < min_price:
-        return ReviewListResponse(items=[], total=0, limit=limit, offset=offset)
-    if max_price is not None and product.price > max_price:
-        return ReviewListResponse(items=[], total=0, limit=limit, offset=offset)
-
     review_filters = [Review.is_active == True, Review.product_id == product.id]
 
+    # Цена товара не проходит фильтры (или не задана): отзывов не будет. Ответ всё равно собирается
+    # общим путём — с той же стратегией total и сериализацией; условие false база отбрасывает без чтения.
+    if (min_price is not None or max_price is not None) and (
+        product.price is None
+        or (min_price is not None and product.price < min_price)
+        or (max_price is not None and product.price > max_price)
+    ):
+        review_filters.append(false())
+
     if search:
         review_filters.append(Review.comment.ilike(f"%{search}%"))
 
-    total_stmt = select(func.count()).select_from(Review).where(*review_filters)
-    total = await db.scalar(total_stmt)
-
-    reviews_stmt = (
-        select(Review)
-        .where(*review_filters)
-        .order_by(Review.id.desc())
-        .limit(limit)
-        .offset(offset)
+    total_stmt = select(Review.id).where(*review_filters)
+    # Равенства по product_id и is_active плюс порядок по id — диапазон индекса ix_reviews_product_feed.
+    reviews_stmt = select(*_review_columns(fields)).where(*review_filters)
+    return await _review_page(
+        db, reviews_stmt, total_stmt, limit=limit, offset=offset, cursor=cursor, count=count, fields=fields,
     )
-    reviews = await db.scalars(reviews_stmt)
 
-    items = [ReviewRead.model_validate(review) for review in reviews.all()]
+# Сводка отзывов товара для карточки. Разрешен доступ всем.
+# Средняя оценка и гистограмма хранятся в строке товара (их поддерживают add_review/delete_review),
+# поэтому сводка — одно чтение товара по уникальному слагу плюс не более latest последних отзывов.
+@router.get("/{product_slug}/summary", response_model=ReviewSummary)
+async def products_review_summary(
+        product_slug: str,
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        latest: int = Query(3, ge=0, le=20, description="Сколько последних отзывов вернуть"),
+        if_none_match: str | None = Header(None),
+):
+    product = (await db.execute(
+        select(
+            Product.id, Product.version, Product.review_count, Product.rating,
+            *(stars_column(star) for star in STARS),
+        )
+        .where(Product.slug == product_slug)
+    )).mappings().first()
+    if product is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found!"
+        )
+
+    # Любой новый или снятый отзыв меняет агрегаты, а значит и версию строки товара.
+    etag = make_etag("review-summary", product["id"], product["version"], latest)
+    if if_none_match and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    reviews = []
+    if latest:
+        result = await db.execute(
+            select(*_review_columns(REVIEW_FIELDS))
+            .where(Review.product_id == product["id"], Review.is_active == True)
+            .order_by(Review.id.desc())
+            .limit(latest)
+        )
+        reviews = result.mappings().all()
+
+    return json_response({
+        "product_id": product["id"],
+        "review_count": product["review_count"],
+        "average": product["rating"],
+        "distribution": {str(star): product[f"stars_{star}"] for star in STARS},
+        "latest": project(reviews, REVIEW_FIELDS),
+    }, headers={"ETag": etag})
 
-    return ReviewListResponse(
-        items=items,
-        total=total or 0,
-        limit=limit,
-        offset=offset,
-    )
 
 # Добавление отзыва. Разрешен доступ только авторизованным пользователям.
 @router.post("/", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
@@ -142,71 +256,69 @@ async def add_review(
 ):
     if get_user:
         user_id = get_user['id']
-        product = await db.scalar(select(Product).where(Product.id == create_review.product_id))
+        product = await db.scalar(select(Product.id).where(Product.id == create_review.product_id))
         if product is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found!"
             )
-        else:
-            # Проверка наличия существующего отзыва от пользователя для данного продукта
-            existing_review = await db.scalar(
-                select(Review).
-                where(Review.user_id == user_id, Review.product_id == create_review.product_id)
+        # Отзыв и агрегаты товара (review_count, grade_sum, rating) меняются одним запросом;
+        # повторный отзыв отсекает уникальный индекс (user_id, product_id), а не отдельный SELECT.
+        added = await add_review_with_aggregates(
+            db,
+            user_id=user_id,
+            product_id=create_review.product_id,
+            comment=create_review.comment,
+            grade=create_review.grade,
+        )
+        if not added:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="You have already posted a review for this product."
             )
-            if existing_review:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="You have already posted a review for this product."
-                )
-            else:
-                async with db.begin():
-                    review_count = await db.scalar(
-                        select(func.count(Review.id)).
-                        where(
-                            Review.product_id == create_review.product_id,
-                            Review.is_active == True,
-                        )
-                    )
-                    review_count = int(review_count or 0)
-                    current_rating = float(product.rating or 0)
-
-                    if review_count == 0:
-                        current_rating = 0.0
-
-                    new_grade = float(create_review.grade)
-
-                    await db.execute(
-                        insert(Review).values(
-                            user_id=user_id,
-                            product_id=create_review.product_id,
-                            comment=create_review.comment,
-                            grade=create_review.grade,
-                            is_active=True,
-                        )
-                    )
-                    if review_count == 0:
-                        new_rating = new_grade
-                    else:
-                        new_rating = round(
-                            (current_rating * review_count + new_grade) / (review_count + 1),
-                            2,
-                        )
-                    await db.execute(
-                        update(Product).
-                        where(Product.id == create_review.product_id).
-                        values(rating=new_rating)
-                    )
-                return MessageResponse(
-                    status_code=status.HTTP_201_CREATED,
-                    transaction="Review added successfully"
-                )
+        await db.commit()
+        return MessageResponse(
+            status_code=status.HTTP_201_CREATED,
+            transaction="Review added successfully"
+        )
     else:
         raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You must be authenticated to add a review"
         )
 
+# Отложенное добавление отзыва: отзыв ставится в очередь и записывается пачкой.
+# Проверки товара и дубликатов выполняются при записи пачки. Разрешен доступ только авторизованным пользователям.
+@router.post("/buffered", response_model=MessageResponse, status_code=status.HTTP_202_ACCEPTED)
+async def add_review_buffered(
+        create_review: CreateReview,
+        get_user: Annotated[dict, Depends(get_current_user)]
+):
+    if not get_user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be authenticated to add a review"
+        )
+    try:
+        await review_queue.submit(PendingReview(
+            user_id=get_user['id'],
+            product_id=create_review.product_id,
+            comment=create_review.comment,
+            grade=create_review.grade,
+        ))
+    except ReviewQueueFull as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(exc),
+            headers={"Retry-After": "1"},
+        )
+    return MessageResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        transaction="Review accepted for processing"
+    )
+
+
 # Удаление отзыва. Разрешен доступ только администраторам.
 @router.delete("/{review_id}", response_model=MessageResponse)
 async def delete_review(
@@ -215,34 +327,13 @@ async def delete_review(
         get_user: Annotated[dict, Depends(get_current_user)]
 ):
     if get_user.get('is_admin'):
-        async with db.begin():
-            review = await db.scalar(select(Review).where(Review.id == review_id, Review.is_active == True))
-            if review is None:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Review not found!"
-                )
-
-            product_id = review.product_id
-            review.is_active = False
-            await db.flush()
-
-            review_stats_stmt = (
-                select(func.count(Review.id), func.avg(Review.grade))
-                .where(Review.product_id == product_id)
-                .where(Review.is_active == True)
-            )
-            review_count, average_grade = (
-                await db.execute(review_stats_stmt)
-            ).one()
-
-            new_rating = round(float(average_grade), 2) if review_count else 0.0
-
-            await db.execute(
-                update(Product)
-                .where(Product.id == product_id)
-                .values(rating=new_rating)
+        # Снятие отзыва и вычитание его оценки из агрегатов товара — один запрос.
+        if not await deactivate_review_with_aggregates(db, review_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Review not found!"
             )
+        await db.commit()
 
         return MessageResponse(
             status_code=status.HTTP_200_OK,
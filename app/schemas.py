@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel, confloat, validator
+from pydantic import BaseModel, Field, confloat, validator
 
 
 class CreateProduct(BaseModel):
@@ -29,13 +29,109 @@ class ProductRead(BaseModel):
         from_attributes = True
 
 
+class CategoryFacet(BaseModel):
+    """Количество товаров текущей выборки в категории."""
+
+    category_id: int | None
+    count: int
+
+
+class PriceBucket(BaseModel):
+    """Корзина гистограммы цен: товары с ценой в диапазоне [min, max]."""
+
+    min: int
+    max: int
+    count: int
+
+
+class ProductFacets(BaseModel):
+    """Фасеты выборки: счётчики по категориям и гистограмма цен."""
+
+    categories: list[CategoryFacet]
+    price: list[PriceBucket]
+
+
 class ProductListResponse(BaseModel):
-    """Список товаров с метаинформацией для пагинации."""
+    """Список товаров с метаинформацией для пагинации.
+
+    ``total`` равен ``None``, если клиент отказался от подсчёта (``count=none``);
+    ``has_more`` показывает, есть ли записи после текущей страницы.
+    ``next_cursor`` — непрозрачный курсор следующей страницы; ``None``, если страниц больше нет.
+    ``facets`` заполняется только при запросе с ``facets=true``.
+    """
 
     items: list[ProductRead]
-    total: int
+    total: int | None
     limit: int
     offset: int
+    has_more: bool = False
+    next_cursor: str | None = None
+    facets: ProductFacets | None = None
+
+
+class ProductSuggestion(BaseModel):
+    """Подсказка автодополнения по названию товара."""
+
+    name: str
+    slug: str
+
+
+class ProductImportError(BaseModel):
+    """Ошибка импорта одной строки: номер записи во входном файле и причина."""
+
+    row: int
+    error: str
+
+
+class ProductImportResponse(BaseModel):
+    """Итог массового импорта товаров."""
+
+    created: int
+    failed: int
+    errors: list[ProductImportError]
+
+
+class ProductBatchRequest(BaseModel):
+    """Пакетный запрос карточек: либо слаги, либо id (до 300 ключей)."""
+
+    slugs: list[str] | None = Field(None, min_length=1, max_length=300)
+    ids: list[int] | None = Field(None, min_length=1, max_length=300)
+
+
+class ProductBatchItem(BaseModel):
+    """Результат по одному ключу запроса; ``found = False`` и ``product = None``, если товар недоступен."""
+
+    key: str | int
+    found: bool
+    product: ProductRead | None
+
+
+class ProductBatchResponse(BaseModel):
+    """Карточки в порядке ключей запроса."""
+
+    items: list[ProductBatchItem]
+
+
+class StockItem(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0, le=1000)
+
+
+class StockRequest(BaseModel):
+    """Позиции резервирования или возврата остатка (до 100 позиций, до 1000 единиц в позиции)."""
+
+    items: list[StockItem] = Field(min_length=1, max_length=100)
+
+
+class StockLevelRead(BaseModel):
+    product_id: int
+    stock: int
+
+
+class StockResponse(BaseModel):
+    """Остатки после операции, по возрастанию id товара."""
+
+    items: list[StockLevelRead]
 
 
 class CreateCategory(BaseModel):
@@ -89,12 +185,27 @@ class ReviewRead(BaseModel):
 
 
 class ReviewListResponse(BaseModel):
-    """Список отзывов с данными о пагинации."""
+    """Список отзывов с данными о пагинации.
+
+    ``next_cursor`` — курсор следующей страницы (как у ``ProductListResponse``).
+    """
 
     items: list[ReviewRead]
-    total: int
+    total: int | None
     limit: int
     offset: int
+    has_more: bool = False
+    next_cursor: str | None = None
+
+
+class ReviewSummary(BaseModel):
+    """Сводка отзывов товара: средняя оценка, распределение по звёздам и последние отзывы."""
+
+    product_id: int
+    review_count: int
+    average: float
+    distribution: dict[int, int]
+    latest: list[ReviewRead]
 
 
 class MessageResponse(BaseModel):
@@ -0,0 +1,62 @@
+"""Streaming NDJSON export of query results.
+
+The export runs a single statement on a server-side cursor in a session of
+its own: the request session is closed by ``get_db`` before a streaming body
+is sent. Rows are fetched ``EXPORT_YIELD_PER`` at a time, serialised one JSON
+object per line and flushed in chunks of about ``CHUNK_SIZE`` bytes, so
+memory stays flat however large the catalog is.
+"""
+
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, AsyncIterator
+
+from loguru import logger
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.backend.db import async_session_maker
+from app.core.settings import settings
+
+CHUNK_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def stream_ndjson(
+        stmt: Select,
+        *,
+        compress: bool = False,
+        yield_per: int = settings.export_yield_per,
+        session_factory: async_sessionmaker = async_session_maker,
+) -> AsyncIterator[bytes]:
+    """Yield the rows of ``stmt`` as NDJSON chunks, optionally gzip-compressed."""
+
+    # wbits=31 — формат gzip (заголовок и CRC), а не «сырой» deflate.
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    buffer = bytearray()
+    async with session_factory() as session:
+        try:
+            result = await session.stream(stmt.execution_options(yield_per=yield_per))
+            async for row in result.mappings():
+                buffer += json.dumps(dict(row), ensure_ascii=False, default=_json_default).encode()
+                buffer += b"\n"
+                if len(buffer) >= CHUNK_SIZE:
+                    chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+                    buffer.clear()
+                    if chunk:
+                        yield chunk
+        except Exception as exc:
+            # Статус уже отправлен: обрываем поток, клиент увидит незавершённый файл.
+            logger.error(f"Catalog export failed: {exc}")
+            raise
+    if compressor:
+        yield compressor.compress(bytes(buffer)) + compressor.flush()
+    elif buffer:
+        yield bytes(buffer)
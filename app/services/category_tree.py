@@ -0,0 +1,135 @@
+"""Process-local cache of the category tree.
+
+The tree holds the parent/child adjacency and, for every category, the
+precomputed set of ids in its subtree, so listing a category with all of its
+descendants needs no query. The ``category`` write endpoints invalidate the
+cache; entries also expire after ``CATEGORY_TREE_TTL`` seconds so that
+workers pick up writes handled elsewhere. While the cache is cold the subtree
+is resolved with a recursive CTE and the tree is rebuilt in the background.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.backend.db import async_session_maker
+from app.core.settings import settings
+from app.models.category import Category
+
+
+@dataclass
+class CategoryTree:
+    """Snapshot of the category hierarchy; never mutated after :meth:`build`."""
+
+    ids_by_slug: dict[str, int]
+    children: dict[int, list[int]]
+    descendants: dict[int, frozenset[int]] = field(default_factory=dict)
+    built_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def build(cls, rows) -> "CategoryTree":
+        """Build a tree from ``(id, slug, parent_id, is_active)`` rows."""
+
+        ids_by_slug: dict[str, int] = {}
+        children: dict[int, list[int]] = {}
+        for category_id, slug, parent_id, is_active in rows:
+            children.setdefault(category_id, [])
+            if is_active:
+                ids_by_slug[slug] = category_id
+            if parent_id is not None:
+                children.setdefault(parent_id, []).append(category_id)
+
+        tree = cls(ids_by_slug=ids_by_slug, children=children)
+        for category_id in children:
+            tree.descendants[category_id] = tree._collect(category_id)
+        return tree
+
+    def _collect(self, root_id: int) -> frozenset[int]:
+        # Обход поддерева с защитой от циклов, которые можно создать через PUT с parent_id.
+        seen = {root_id}
+        stack = [root_id]
+        while stack:
+            for child_id in self.children.get(stack.pop(), ()):
+                if child_id not in seen:
+                    seen.add(child_id)
+                    stack.append(child_id)
+        return frozenset(seen)
+
+    def subtree(self, slug: str) -> frozenset[int] | None:
+        """Ids of the active category ``slug`` and all of its descendants."""
+
+        category_id = self.ids_by_slug.get(slug)
+        if category_id is None:
+            return None
+        return self.descendants[category_id]
+
+
+async def subtree_ids_via_cte(db: AsyncSession, slug: str) -> frozenset[int] | None:
+    """Resolve a category subtree in one round trip with a recursive CTE."""
+
+    tree = (
+        select(Category.id)
+        .where(Category.slug == slug, Category.is_active == True)
+        .cte("category_tree", recursive=True)
+    )
+    tree = tree.union(select(Category.id).where(Category.parent_id == tree.c.id))
+    ids = (await db.scalars(select(tree.c.id))).all()
+    return frozenset(ids) or None
+
+
+class CategoryTreeCache:
+    """Holds the current :class:`CategoryTree` of this worker."""
+
+    def __init__(self):
+        self._tree: CategoryTree | None = None
+        self._generation = 0
+        self._refresh_task: asyncio.Task | None = None
+
+    def get(self) -> CategoryTree | None:
+        tree = self._tree
+        if tree is None or time.monotonic() - tree.built_at >= settings.category_tree_ttl:
+            return None
+        return tree
+
+    def invalidate(self) -> None:
+        # Поколение отбрасывает результат перестроения, начатого до инвалидации.
+        self._generation += 1
+        self._tree = None
+
+    async def refresh(self, session_factory: async_sessionmaker = async_session_maker) -> CategoryTree:
+        generation = self._generation
+        async with session_factory() as session:
+            result = await session.execute(
+                select(Category.id, Category.slug, Category.parent_id, Category.is_active)
+            )
+            tree = CategoryTree.build(result.all())
+        if generation == self._generation:
+            self._tree = tree
+        return tree
+
+    def schedule_refresh(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_quietly())
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as exc:
+            logger.error(f"Category tree refresh failed: {exc}")
+
+    async def subtree_ids(self, db: AsyncSession, slug: str) -> frozenset[int] | None:
+        """Ids of the active category ``slug`` and its whole subtree, or ``None`` if it does not exist."""
+
+        tree = self.get()
+        if tree is not None:
+            return tree.subtree(slug)
+        self.schedule_refresh()
+        return await subtree_ids_via_cte(db, slug)
+
+
+category_tree = CategoryTreeCache()
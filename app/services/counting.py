@@ -0,0 +1,106 @@
+"""Strategies for computing ``total`` in paginated list responses."""
+
+import json
+from enum import Enum
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.backend.db import async_session_maker
+from app.core.settings import settings
+from app.services.cache import TTLCache
+from app.services.query_cache import query_cache
+
+
+class CountStrategy(str, Enum):
+    """How the total number of matching rows is obtained.
+
+    * ``exact`` — ``SELECT count(*)`` with the same filters as the page.
+    * ``estimated`` — the planner's row estimate (Postgres ``EXPLAIN``); other
+      dialects fall back to an exact count.
+    * ``cached`` — exact count memoised per filter set for a short TTL.
+    * ``none`` — no count at all; clients rely on ``has_more``.
+    """
+
+    exact = "exact"
+    estimated = "estimated"
+    cached = "cached"
+    none = "none"
+
+
+_count_cache = TTLCache(maxsize=settings.count_cache_size, ttl=settings.count_cache_ttl)
+
+
+def clear_count_cache() -> None:
+    """Drop every memoised count (used by tests and after bulk writes)."""
+
+    _count_cache.clear()
+
+
+def _statement_key(stmt: Select) -> tuple[str, str]:
+    compiled = stmt.compile()
+    return str(compiled), repr(sorted(compiled.params.items()))
+
+
+async def _exact_count(session: AsyncSession, rows: Select, read_through: bool = False) -> int:
+    count_stmt = select(func.count().label("total")).select_from(rows.order_by(None).subquery())
+    if read_through:
+        result = await query_cache.fetch(session, count_stmt)
+        return int(result[0]["total"] or 0)
+    return int(await session.scalar(count_stmt) or 0)
+
+
+async def _estimated_count(session: AsyncSession, rows: Select) -> int:
+    dialect = session.bind.dialect
+    compiled = rows.order_by(None).compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    connection = await session.connection()
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_rows(
+        rows: Select,
+        strategy: CountStrategy = CountStrategy.exact,
+        *,
+        read_through: bool = False,
+        session_factory: async_sessionmaker = async_session_maker,
+) -> int | None:
+    """Count the rows selected by ``rows`` according to ``strategy``.
+
+    The count runs in its own session so that callers can await it
+    concurrently with the page query issued on the request session.
+
+    Args:
+        rows: Statement selecting the rows of the list (ordering is ignored).
+        strategy: Counting strategy requested by the client.
+        read_through: Serve ``exact`` counts through the query-result cache,
+            which stays exact because entries are invalidated on writes.
+        session_factory: Factory for the dedicated counting session.
+
+    Returns:
+        The (possibly estimated) number of rows, or ``None`` for ``none``.
+    """
+
+    if strategy is CountStrategy.none:
+        return None
+
+    key = None
+    if strategy is CountStrategy.cached:
+        key = _statement_key(rows)
+        cached = _count_cache.get(key)
+        if cached is not None:
+            return cached
+
+    async with session_factory() as session:
+        if strategy is CountStrategy.estimated and session.bind.dialect.name == "postgresql":
+            total = await _estimated_count(session, rows)
+        else:
+            read_through = read_through and strategy is CountStrategy.exact
+            total = await _exact_count(session, rows, read_through)
+
+    if key is not None:
+        _count_cache.set(key, total)
+    return total
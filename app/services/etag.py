@@ -0,0 +1,43 @@
+"""Strong ETags and ``If-None-Match`` handling for catalog reads."""
+
+import hashlib
+from datetime import date, datetime
+from typing import Any
+
+from fastapi import Response, status
+
+
+def _normalize(value: Any) -> Any:
+    # Строки из Redis-уровня кэша содержат даты в ISO-формате, из БД — datetime.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from values that identify a representation.
+
+    Callers pass row ids and versions plus whatever else shapes the body
+    (totals, cursors), never the full rows, so the tag can be computed
+    from a narrow query.
+    """
+
+    digest = hashlib.sha1(repr(_normalize(parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of ``If-None-Match`` against ``etag`` as RFC 9110 prescribes."""
+
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,106 @@
+"""Facet aggregates (category counts and price histogram) for product lists.
+
+Both facets come from one statement that scans the filtered rows once:
+price bounds are taken with window functions, rows are grouped by
+``(category_id, price bucket)`` and the two facets are summed up from that
+grid in Python. The grid is read through the query-result cache, so each
+filter combination is computed once until ``products`` changes.
+"""
+
+from collections import Counter
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.backend.db import async_session_maker
+from app.core.settings import settings
+from app.models import Product
+from app.schemas import CategoryFacet, PriceBucket, ProductFacets
+from app.services.query_cache import query_cache
+
+
+def facets_statement(filters: list, buckets: int):
+    rows = (
+        select(
+            Product.category_id,
+            Product.price,
+            func.min(Product.price).over().label("low"),
+            func.max(Product.price).over().label("high"),
+        )
+        .where(*filters)
+        .subquery("faceted")
+    )
+    # Целочисленное деление раскладывает цены [low, high] по корзинам 0..buckets-1.
+    bucketed = select(
+        rows.c.category_id,
+        ((rows.c.price - rows.c.low) * buckets // (rows.c.high - rows.c.low + 1)).label("bucket"),
+        rows.c.low,
+        rows.c.high,
+    ).subquery("bucketed")
+    return (
+        select(
+            bucketed.c.category_id,
+            bucketed.c.bucket,
+            func.min(bucketed.c.low).label("low"),
+            func.max(bucketed.c.high).label("high"),
+            func.count().label("products"),
+        )
+        .group_by(bucketed.c.category_id, bucketed.c.bucket)
+    )
+
+
+def _ceil_div(numerator: int, denominator: int) -> int:
+    return -(-numerator // denominator)
+
+
+def _category_facets(by_category: Counter) -> list[CategoryFacet]:
+    return [
+        CategoryFacet(category_id=category_id, count=total)
+        for category_id, total in sorted(by_category.items(), key=lambda item: (-item[1], item[0] or 0))
+    ]
+
+
+def build_facets(grid: list[dict], buckets: int) -> ProductFacets:
+    """Fold ``(category_id, bucket)`` counts into the two facets."""
+
+    if not grid:
+        return ProductFacets(categories=[], price=[])
+
+    by_category: Counter = Counter()
+    by_bucket: Counter = Counter()
+    for cell in grid:
+        by_category[cell["category_id"]] += cell["products"]
+        # Товары без цены учитываются в категориях, но не попадают в гистограмму.
+        if cell["bucket"] is not None:
+            by_bucket[int(cell["bucket"])] += cell["products"]
+
+    low, high = grid[0]["low"], grid[0]["high"]
+    price = []
+    if low is None:
+        return ProductFacets(categories=_category_facets(by_category), price=price)
+    span = high - low + 1
+    for index in range(buckets):
+        # Границы корзины — обратное преобразование формулы из facets_statement.
+        bucket_min = low + _ceil_div(index * span, buckets)
+        bucket_max = low + _ceil_div((index + 1) * span, buckets) - 1
+        if bucket_min <= bucket_max:
+            price.append(PriceBucket(min=bucket_min, max=bucket_max, count=by_bucket[index]))
+
+    return ProductFacets(categories=_category_facets(by_category), price=price)
+
+
+async def product_facets(
+        filters: list,
+        *,
+        buckets: int = settings.facet_price_buckets,
+        session_factory: async_sessionmaker = async_session_maker,
+) -> ProductFacets:
+    """Category counts and price histogram for the rows matching ``filters``.
+
+    Runs in its own session so it can be awaited concurrently with the page
+    and count queries.
+    """
+
+    async with session_factory() as session:
+        grid = await query_cache.fetch(session, facets_statement(filters, buckets))
+    return build_facets(grid, buckets)
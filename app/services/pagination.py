@@ -0,0 +1,114 @@
+"""Keyset (cursor) pagination helpers for list endpoints."""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Mapping, Sequence
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor cannot be decoded for the requested sort order."""
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """Single column of a sort order together with its direction."""
+
+    column: Any
+    descending: bool = False
+
+
+@dataclass(frozen=True)
+class SortOrder:
+    """Ordered set of columns a list is sorted and seeked by.
+
+    The last key must be unique (usually the primary key) so that every row
+    has a distinct position and the keyset predicate never skips or repeats
+    rows between pages.
+    """
+
+    name: str
+    keys: tuple[SortKey, ...]
+
+    def order_by(self) -> list[ColumnElement]:
+        return [key.column.desc() if key.descending else key.column.asc() for key in self.keys]
+
+    def columns(self) -> list[ColumnElement]:
+        """Sort key expressions labelled so that :meth:`values_of` can read them back."""
+
+        return [key.column.label(f"sort_{index}") for index, key in enumerate(self.keys)]
+
+    def values_of(self, row: Mapping[str, Any]) -> list[Any]:
+        """Sort key values of a result row mapping selected together with :meth:`columns`."""
+
+        return [row[f"sort_{index}"] for index in range(len(self.keys))]
+
+    def seek(self, values: Sequence[Any]) -> ColumnElement:
+        """Build a predicate selecting rows strictly after ``values``.
+
+        When every key shares one direction a row-value comparison is used,
+        which Postgres turns into a single index range condition. Mixed
+        directions fall back to the expanded ``(a > x) OR (a = x AND b > y)``
+        form.
+        """
+
+        directions = {key.descending for key in self.keys}
+        if len(directions) == 1:
+            columns = tuple_(*(key.column for key in self.keys))
+            bound = tuple_(*values)
+            return columns < bound if self.keys[0].descending else columns > bound
+
+        clauses = []
+        for index, key in enumerate(self.keys):
+            equals = [prev.column == value for prev, value in zip(self.keys[:index], values[:index])]
+            step = key.column < values[index] if key.descending else key.column > values[index]
+            clauses.append(and_(*equals, step))
+        return or_(*clauses)
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _load_value(key: SortKey, value: Any) -> Any:
+    if value is None:
+        return None
+    python_type = key.column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(order: SortOrder, values: Sequence[Any]) -> str:
+    """Pack the sort key values of the last row into an opaque token."""
+
+    payload = {"s": order.name, "k": [_dump_value(value) for value in values]}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(order: SortOrder, cursor: str) -> list[Any]:
+    """Unpack a token produced by :func:`encode_cursor` for ``order``.
+
+    Raises:
+        InvalidCursorError: The token is malformed or belongs to another sort order.
+    """
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["k"]
+        if payload["s"] != order.name or len(values) != len(order.keys):
+            raise InvalidCursorError("Cursor does not match the requested sort order")
+        return [_load_value(key, value) for key, value in zip(order.keys, values)]
+    except InvalidCursorError:
+        raise
+    except (binascii.Error, ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursorError("Malformed cursor") from exc
@@ -0,0 +1,103 @@
+"""Password hashing off the event loop.
+
+A bcrypt hash or check takes a few hundred milliseconds of CPU at the
+default cost. Run inline in an ``async def`` handler it stalls every other
+request of the worker, so all hashing goes through :data:`password_hasher`:
+calls run in a dedicated thread pool (bcrypt releases the GIL, so threads
+hash in parallel) of ``PASSWORD_HASH_WORKERS`` threads. Callers beyond that
+wait on a semaphore rather than piling up in the executor queue, and the
+wait is recorded in :meth:`PasswordHasher.stats`.
+
+The cost factor is ``PASSWORD_BCRYPT_ROUNDS``. Hashes made with another cost
+are flagged by :meth:`PasswordHasher.verify_and_update`, so logins migrate
+stored hashes to the current cost transparently.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from passlib.context import CryptContext
+
+from app.core.settings import settings
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    """bcrypt via passlib, executed in a bounded thread pool."""
+
+    def __init__(self, rounds: int = settings.password_bcrypt_rounds, workers: int = settings.password_hash_workers):
+        self.rounds = rounds
+        self.workers = workers
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self.calls = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _pool(self) -> tuple[ThreadPoolExecutor, asyncio.Semaphore]:
+        # Пул и семафор создаются лениво, в цикле событий воркера.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._executor, self._slots
+
+    async def _run(self, function: Callable[..., T], *args) -> T:
+        executor, slots = self._pool()
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - queued
+        self.calls += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        finally:
+            slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str | None) -> bool:
+        if not hashed_password:
+            return False
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str | None) -> tuple[bool, str | None]:
+        """Check a password; on success also return a new hash if the stored one uses another cost.
+
+        Returns:
+            ``(valid, new_hash)``; ``new_hash`` is ``None`` when the stored hash is current.
+        """
+
+        if not hashed_password:
+            return False, None
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        """Counters for monitoring: calls so far, callers waiting now and time spent waiting for a slot."""
+
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "calls": self.calls,
+            "waiting": self.waiting,
+            "wait_avg_ms": round(self.wait_total / self.calls * 1000, 3) if self.calls else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = self._slots = None
+
+
+password_hasher = PasswordHasher()
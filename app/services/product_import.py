@@ -0,0 +1,245 @@
+"""Streaming bulk import of products from NDJSON or CSV.
+
+The request body is parsed record by record as it arrives, so memory use
+does not depend on the size of the upload. Valid records are buffered into
+batches of ``IMPORT_BATCH_SIZE``; each batch costs one category lookup, at
+most two slug lookups and one multi-row ``INSERT ... RETURNING``, and is
+committed on its own so a failing batch does not discard earlier ones.
+"""
+
+import codecs
+import csv
+import json
+from collections import Counter
+from enum import Enum
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from slugify import slugify
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import settings
+from app.models import Category, Product
+from app.schemas import CreateProduct, ProductImportError, ProductImportResponse
+from app.services.suggest import product_suggestions
+
+# (номер строки во входном файле, данные записи, ошибка разбора)
+Record = tuple[int, dict | None, str | None]
+
+
+class ImportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # utf-8-sig отбрасывает BOM, который добавляют табличные редакторы при экспорте CSV.
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """One JSON object per line; blank lines are skipped."""
+
+    number = 0
+    async for line in _lines(chunks):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line), None
+        except ValueError as exc:
+            yield number, None, f"Invalid JSON: {exc}"
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """CSV with a header row naming the ``CreateProduct`` fields."""
+
+    header = None
+    pending: list[str] = []
+    number = start = 0
+    async for line in _lines(chunks):
+        number += 1
+        if not pending:
+            start = number
+        pending.append(line)
+        record = "\n".join(pending)
+        # Нечётное число кавычек — поле в кавычках продолжается на следующей строке.
+        if record.count('"') % 2:
+            continue
+        pending = []
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) != len(header):
+            yield start, None, f"Expected {len(header)} columns, got {len(values)}"
+        else:
+            yield start, dict(zip(header, values)), None
+    if pending:
+        yield start, None, "Unterminated quoted field"
+
+
+def parse_records(import_format: ImportFormat, chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    if import_format is ImportFormat.csv:
+        return csv_records(chunks)
+    return ndjson_records(chunks)
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def _violated_constraint(exc: IntegrityError) -> str:
+    """Kind of constraint a batch insert hit: ``slug``, ``foreign_key`` or ``other``."""
+
+    message = str(exc.orig).lower()
+    if "slug" in message and ("unique" in message or "duplicate" in message):
+        return "slug"
+    if "foreign key" in message:
+        return "foreign_key"
+    return "other"
+
+
+class ProductImport:
+    """Validates records and writes them to ``products`` in batches.
+
+    Category existence and slug uniqueness are resolved per batch; what was
+    learned stays in the instance, so later batches only query for new ids
+    and new slugs.
+    """
+
+    def __init__(self, db: AsyncSession, supplier_id: int | None, batch_size: int = settings.import_batch_size):
+        self.db = db
+        self.supplier_id = supplier_id
+        self.batch_size = batch_size
+        self.created = 0
+        self.errors: list[ProductImportError] = []
+        self._batch: list[tuple[int, CreateProduct]] = []
+        self._categories: dict[int, bool] = {}
+        self._slugs: set[str] = set()
+        self._scanned: set[str] = set()
+        self._suffixes: dict[str, int] = {}
+
+    def _fail(self, row: int, error: str) -> None:
+        self.errors.append(ProductImportError(row=row, error=error))
+
+    async def run(self, records: AsyncIterator[Record]) -> ProductImportResponse:
+        async for row, data, error in records:
+            if error is not None:
+                self._fail(row, error)
+                continue
+            try:
+                product = CreateProduct.model_validate(data)
+            except ValidationError as exc:
+                self._fail(row, _describe(exc))
+                continue
+            self._batch.append((row, product))
+            if len(self._batch) >= self.batch_size:
+                await self._flush()
+        await self._flush()
+        return ProductImportResponse(created=self.created, failed=len(self.errors), errors=self.errors)
+
+    async def _known_categories(self, ids: set[int]) -> None:
+        unknown = ids - self._categories.keys()
+        if unknown:
+            found = set(await self.db.scalars(select(Category.id).where(Category.id.in_(unknown))))
+            self._categories.update({category_id: category_id in found for category_id in unknown})
+
+    async def _allocate_slugs(self, names: list[str]) -> list[str]:
+        bases = [slugify(name) or "product" for name in names]
+
+        fresh = set(bases) - self._slugs
+        if fresh:
+            self._slugs.update(await self.db.scalars(select(Product.slug).where(Product.slug.in_(fresh))))
+
+        # Для занятых и повторяющихся в пачке слагов один раз подгружаем уже выданные суффиксы.
+        counts = Counter(bases)
+        clashing = {base for base in counts if base in self._slugs or counts[base] > 1} - self._scanned
+        if clashing:
+            self._slugs.update(await self.db.scalars(
+                select(Product.slug).where(or_(*(Product.slug.like(f"{base}-%") for base in clashing)))
+            ))
+            self._scanned |= clashing
+
+        slugs = []
+        for base in bases:
+            slug = base
+            while slug in self._slugs:
+                self._suffixes[base] = self._suffixes.get(base, 0) + 1
+                slug = f"{base}-{self._suffixes[base]}"
+            self._slugs.add(slug)
+            slugs.append(slug)
+        return slugs
+
+    async def _flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        await self._known_categories({product.category for _, product in batch})
+        valid = []
+        for row, product in batch:
+            if self._categories[product.category]:
+                valid.append((row, product))
+            else:
+                self._fail(row, "Category not found!")
+        if not valid:
+            return
+
+        slugs = await self._allocate_slugs([product.name for _, product in valid])
+        values = [
+            {
+                "name": product.name,
+                "description": product.description,
+                "price": product.price,
+                "image_url": product.image_url,
+                "stock": product.stock,
+                "category_id": product.category,
+                "supplier_id": self.supplier_id,
+                "slug": slug,
+                "is_active": True,
+            }
+            for (_, product), slug in zip(valid, slugs)
+        ]
+        try:
+            result = await self.db.execute(
+                insert(Product).returning(Product.id, Product.name, Product.slug, Product.stock),
+                values,
+            )
+            created = result.all()
+            await self.db.commit()
+        except IntegrityError as exc:
+            # Параллельная запись (занятый слаг, удалённая категория): откатывается только эта пачка.
+            await self.db.rollback()
+            constraint = _violated_constraint(exc)
+            if constraint == "slug":
+                error = "Product slug was taken by a concurrent write, batch rolled back"
+            elif constraint == "foreign_key":
+                error = "Category or supplier was deleted during the import, batch rolled back"
+                # Известные категории могли устареть — следующие пачки проверят их заново.
+                self._categories.clear()
+            else:
+                error = f"Constraint violation, batch rolled back: {exc.orig}"
+            for row, _ in valid:
+                self._fail(row, error)
+            return
+
+        self.created += len(created)
+        for product_id, name, slug, stock in created:
+            if stock > 0:
+                product_suggestions.add(product_id, name, slug)
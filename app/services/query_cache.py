@@ -0,0 +1,213 @@
+"""Read-through cache for SQLAlchemy ``select`` results.
+
+Entries are keyed by the compiled statement, its parameters and the current
+version of every table the statement reads from. Any committed write to a
+table bumps that table's version, so older entries are simply never looked
+up again and age out of the LRU.
+
+Versions are tracked automatically: session event listeners record the
+tables touched by flushes and by Core ``insert``/``update``/``delete``
+statements and bump their counters on commit. Without Redis the counters
+and entries live in the worker. With ``QUERY_CACHE_REDIS_URL`` set, Redis
+holds the shared version counters and acts as a second cache tier behind the
+in-process LRU. Bumps are published by :func:`app.backend.db_depends.get_db`
+before the response is sent, so every worker sees a write by the time its
+author gets a reply.
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Iterable
+
+from loguru import logger
+from sqlalchemy import Select, Table, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import visitors
+
+from app.backend.db import REPLICA_SESSION
+from app.core.settings import settings
+from app.services.cache import TTLCache
+
+_TOUCHED = "query_cache_touched"
+_UNPUBLISHED = "query_cache_unpublished"
+
+
+def statement_tables(stmt: Select) -> tuple[str, ...]:
+    """Names of all tables a statement reads from, including subqueries."""
+
+    names = {element.name for element in visitors.iterate(stmt) if isinstance(element, Table)}
+    return tuple(sorted(names))
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class QueryCache:
+    """Two-tier (in-process LRU + optional Redis) cache of query results."""
+
+    def __init__(self, maxsize: int, ttl: float, redis_url: str | None = None):
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: defaultdict[str, int] = defaultdict(int)
+        self._redis = None
+
+    def _client(self):
+        if self.redis_url is None:
+            return None
+        if self._redis is None:
+            from redis.asyncio import Redis
+
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+    def bump_local(self, tables: Iterable[str]) -> None:
+        for table in tables:
+            self._versions[table] += 1
+
+    async def publish(self, tables: Iterable[str]) -> None:
+        """Bump the shared Redis counters for ``tables``."""
+
+        tables = sorted(set(tables))
+        client = self._client()
+        if client is None or not tables:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for table in tables:
+                    pipe.incr(f"qc:version:{table}")
+                await pipe.execute()
+        except Exception as exc:
+            logger.error(f"Query cache version bump failed for {tables}: {exc}")
+
+    async def _current_versions(self, tables: tuple[str, ...]) -> tuple[int, ...] | None:
+        client = self._client()
+        if client is None:
+            return tuple(self._versions[table] for table in tables)
+        try:
+            values = await client.mget([f"qc:version:{table}" for table in tables])
+        except Exception as exc:
+            logger.error(f"Query cache version lookup failed: {exc}")
+            return None
+        return tuple(int(value or 0) for value in values)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._versions.clear()
+
+    async def fetch(self, db: AsyncSession, stmt: Select, *, ttl: float | None = None) -> list[dict]:
+        """Execute ``stmt`` through the cache and return its rows as dicts.
+
+        The returned list may be shared between requests and must be treated
+        as read-only. When the version lookup fails (Redis unavailable) or
+        ``ttl`` is not positive the statement is executed directly.
+        """
+
+        # Реплика может отставать: её результаты не должны попадать клиентам, читающим из основной базы.
+        source = "replica" if db.info.get(REPLICA_SESSION) else "primary"
+        ttl = self.ttl if ttl is None else ttl
+        if source == "replica":
+            # Чтение сразу после записи могло вернуть строки до неё, но под новой версией таблиц;
+            # такая запись живёт не дольше допустимого отставания реплики.
+            ttl = min(ttl, settings.replica_max_lag)
+        if ttl <= 0:
+            return await self._execute(db, stmt)
+
+        tables = statement_tables(stmt)
+        versions = await self._current_versions(tables)
+        if versions is None:
+            return await self._execute(db, stmt)
+
+        compiled = stmt.compile(dialect=db.bind.dialect)
+        raw_key = f"{compiled}|{sorted(compiled.params.items())!r}|{tables}|{versions}|{source}"
+        key = hashlib.sha1(raw_key.encode()).hexdigest()
+
+        rows = self._entries.get(key)
+        if rows is not None:
+            return rows
+
+        client = self._client()
+        if client is not None:
+            try:
+                cached = await client.get(f"qc:entry:{key}")
+            except Exception as exc:
+                logger.error(f"Query cache read failed: {exc}")
+                cached = None
+            if cached is not None:
+                rows = json.loads(cached)
+                self._entries.set(key, rows, ttl)
+                return rows
+
+        rows = await self._execute(db, stmt)
+        self._entries.set(key, rows, ttl)
+        if client is not None:
+            try:
+                await client.set(f"qc:entry:{key}", json.dumps(rows, default=_json_default), px=max(int(ttl * 1000), 1))
+            except Exception as exc:
+                logger.error(f"Query cache write failed: {exc}")
+        return rows
+
+    @staticmethod
+    async def _execute(db: AsyncSession, stmt: Select) -> list[dict]:
+        result = await db.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+
+query_cache = QueryCache(
+    maxsize=settings.query_cache_size,
+    ttl=settings.query_cache_ttl,
+    redis_url=settings.query_cache_redis_url,
+)
+
+
+def track_write(session: AsyncSession, *tables: str) -> None:
+    """Record writes the listeners cannot see (e.g. DML inside a CTE) for the next commit."""
+
+    session.sync_session.info.setdefault(_TOUCHED, set()).update(tables)
+
+
+async def publish_session_writes(session: AsyncSession) -> set[str] | None:
+    """Publish version bumps for the tables committed by ``session``; returns those tables."""
+
+    tables = session.info.pop(_UNPUBLISHED, None)
+    if tables:
+        await query_cache.publish(tables)
+    return tables
+
+
+# Отслеживание записей: таблицы, изменённые во flush или Core-запросами, копятся в session.info
+# и получают новую версию после commit.
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context) -> None:
+    touched = session.info.setdefault(_TOUCHED, set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(instance, "__table__", None)
+        if table is not None:
+            touched.add(table.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_execute(state) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None:
+            state.session.info.setdefault(_TOUCHED, set()).add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session: Session) -> None:
+    touched = session.info.pop(_TOUCHED, None)
+    if touched:
+        query_cache.bump_local(touched)
+        session.info.setdefault(_UNPUBLISHED, set()).update(touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session) -> None:
+    session.info.pop(_TOUCHED, None)
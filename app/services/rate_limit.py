@@ -0,0 +1,299 @@
+"""Token-bucket rate limiting and load shedding for the HTTP API.
+
+Every request takes a token from the client's general bucket
+(``RATE_LIMIT_DEFAULT``). Expensive routes also take one from a bucket of
+their own, per client. Those are logins and registrations, which cost a
+bcrypt hash each (``RATE_LIMIT_AUTH``), and ``search=`` queries
+(``RATE_LIMIT_SEARCH``). A limit is written ``"<requests>/<seconds>"``: the
+bucket holds that many tokens and refills at ``requests / seconds`` per
+second, so short bursts pass and sustained load is spread out.
+
+Buckets live in the worker (:class:`MemoryBuckets`) or, with
+``RATE_LIMIT_REDIS_URL`` set, in Redis (:class:`RedisBuckets`): one Lua
+script refills and takes atomically, so all gunicorn workers share the
+limits. If Redis is unreachable, requests are let through.
+
+Clients are told apart by address. Behind reverse proxies the socket peer is
+the proxy, so the client address is read from ``X-Forwarded-For``: every
+proxy appends the address it received the request from, hence with
+``RATE_LIMIT_TRUSTED_PROXIES`` proxies in front (1 for the shipped nginx)
+the client is the N-th entry from the right. Entries further left were
+written by the client itself and are ignored, so a spoofed header cannot
+buy a fresh bucket. The header is only read when the peer is a loopback or
+private address, i.e. a proxy on the internal network.
+
+Independently of the buckets, a worker serving ``RATE_LIMIT_MAX_IN_FLIGHT``
+requests at once answers new ones with 503 instead of queueing them.
+Rejected requests get ``Retry-After``. Every limited response carries
+``RateLimit-Limit``, ``RateLimit-Remaining``, ``RateLimit-Reset`` and
+``RateLimit-Policy`` for its tightest bucket.
+"""
+
+import ipaddress
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import parse_qs
+
+from loguru import logger
+
+from app.core.settings import settings
+from app.services.cache import TTLCache
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """``capacity`` requests per ``period`` seconds."""
+
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        requests, _, seconds = value.partition("/")
+        return cls(int(requests), float(seconds or 1))
+
+    def policy(self) -> str:
+        return f"{self.capacity};w={self.period:g}"
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    limit: RateLimit
+    remaining: int
+    # Секунды до полного восстановления корзины и до следующего доступного токена.
+    reset_after: float
+    retry_after: float
+
+
+def _decide(limit: RateLimit, tokens: float, allowed: bool) -> Decision:
+    return Decision(
+        allowed=allowed,
+        limit=limit,
+        remaining=int(tokens),
+        reset_after=(limit.capacity - tokens) / limit.rate,
+        retry_after=0.0 if allowed else (1 - tokens) / limit.rate,
+    )
+
+
+class MemoryBuckets:
+    """Buckets of one worker process.
+
+    An idle bucket refills completely after ``period`` seconds, so entries
+    expire then and the map stays bounded by the number of active clients.
+    """
+
+    def __init__(self, maxsize: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self._buckets = TTLCache(maxsize=maxsize)
+        self._clock = clock
+
+    async def take(self, key: str, limit: RateLimit) -> Decision:
+        now = self._clock()
+        tokens, updated = self._buckets.get(key, (float(limit.capacity), now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets.set(key, (tokens, now), limit.period)
+        return _decide(limit, tokens, allowed)
+
+
+# Атомарное пополнение и списание; время берётся у Redis, чтобы воркеры с разными часами не расходились.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """Buckets shared by all workers through Redis."""
+
+    def __init__(self, redis_url: str):
+        self.redis_url = redis_url
+        self._script = None
+
+    def _take_script(self):
+        if self._script is None:
+            from redis.asyncio import Redis
+
+            self._script = Redis.from_url(self.redis_url).register_script(_TAKE_SCRIPT)
+        return self._script
+
+    async def take(self, key: str, limit: RateLimit) -> Decision | None:
+        """Take a token; ``None`` when Redis is unavailable (the request is not limited)."""
+
+        try:
+            allowed, tokens = await self._take_script()(keys=[f"rl:{key}"], args=[limit.capacity, limit.rate])
+        except Exception as exc:
+            logger.error(f"Rate limit check failed for {key}: {exc}")
+            return None
+        return _decide(limit, float(tokens), bool(int(allowed)))
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    """Extra bucket for requests matching ``method`` and ``path``, optionally only with a query parameter."""
+
+    name: str
+    method: str
+    path: re.Pattern
+    limit: RateLimit
+    query_param: str | None = None
+
+    def matches(self, method: str, path: str, query: dict[str, list[str]]) -> bool:
+        if method != self.method or not self.path.match(path):
+            return False
+        if self.query_param is None:
+            return True
+        return any(value.strip() for value in query.get(self.query_param, []))
+
+
+def default_rules() -> tuple[RouteRule, ...]:
+    auth = RateLimit.parse(settings.rate_limit_auth)
+    return (
+        RouteRule("auth", "POST", re.compile(r"^/v1/auth/(token)?$"), auth),
+        RouteRule("admin-login", "POST", re.compile(r"^/admin/login$"), auth),
+        RouteRule("search", "GET", re.compile(r"^/v1/"), RateLimit.parse(settings.rate_limit_search), "search"),
+    )
+
+
+def _internal(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return ip.is_private or ip.is_loopback
+
+
+def _client_id(scope, trusted_proxies: int = settings.rate_limit_trusted_proxies) -> str:
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if trusted_proxies <= 0 or not _internal(peer):
+        return peer
+
+    forwarded = []
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            forwarded.extend(part.strip() for part in value.decode("latin-1").split(","))
+    forwarded = [address for address in forwarded if address]
+    if not forwarded:
+        return peer
+    # Доверенные прокси дописывают адреса справа; всё левее N-й записи с конца прислал сам клиент.
+    return forwarded[-trusted_proxies] if len(forwarded) >= trusted_proxies else forwarded[0]
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying the buckets and the in-flight cap to HTTP requests."""
+
+    def __init__(
+            self,
+            app,
+            *,
+            backend=None,
+            default_limit: RateLimit | None = None,
+            rules: tuple[RouteRule, ...] | None = None,
+            max_in_flight: int = settings.rate_limit_max_in_flight,
+            trusted_proxies: int = settings.rate_limit_trusted_proxies,
+    ):
+        self.app = app
+        if backend is None:
+            backend = RedisBuckets(settings.rate_limit_redis_url) if settings.rate_limit_redis_url else MemoryBuckets()
+        self.backend = backend
+        self.default_limit = default_limit or RateLimit.parse(settings.rate_limit_default)
+        self.rules = default_rules() if rules is None else rules
+        self.max_in_flight = max_in_flight
+        self.trusted_proxies = trusted_proxies
+        self.in_flight = 0
+
+    async def _check(self, scope) -> list[Decision]:
+        client = _client_id(scope, self.trusted_proxies)
+        method, path = scope["method"], scope["path"]
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+
+        decisions = []
+        # Сначала корзины дорогих маршрутов: отказ по ним не тратит общий токен клиента.
+        for rule in self.rules:
+            if rule.matches(method, path, query):
+                decision = await self.backend.take(f"{rule.name}:{client}", rule.limit)
+                if decision is not None:
+                    decisions.append(decision)
+                    if not decision.allowed:
+                        return decisions
+        decision = await self.backend.take(f"client:{client}", self.default_limit)
+        if decision is not None:
+            decisions.append(decision)
+        return decisions
+
+    @staticmethod
+    def _headers(decision: Decision) -> list[tuple[bytes, bytes]]:
+        headers = [
+            (b"ratelimit-limit", str(decision.limit.capacity).encode()),
+            (b"ratelimit-remaining", str(decision.remaining).encode()),
+            (b"ratelimit-reset", str(math.ceil(decision.reset_after)).encode()),
+            (b"ratelimit-policy", decision.limit.policy().encode()),
+        ]
+        if not decision.allowed:
+            headers.append((b"retry-after", str(max(1, math.ceil(decision.retry_after))).encode()))
+        return headers
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, headers: list[tuple[bytes, bytes]]) -> None:
+        body = f'{{"detail":"{detail}"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            await self._reject(send, 503, "Server is overloaded, try again later", [(b"retry-after", b"1")])
+            return
+
+        decisions = await self._check(scope)
+        # В заголовки — самая строгая из корзин запроса.
+        tightest = min(decisions, key=lambda decision: (decision.allowed, decision.remaining), default=None)
+        if tightest is not None and not tightest.allowed:
+            await self._reject(send, 429, "Too many requests", self._headers(tightest))
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and tightest is not None:
+                message = {**message, "headers": [*message.get("headers", []), *self._headers(tightest)]}
+            await send(message)
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,197 @@
+"""Per-product review aggregates kept in step with review writes.
+
+``products.review_count``, ``products.grade_sum`` and the grade histogram
+``products.stars_1`` .. ``stars_5`` are adjusted by the same statement that
+inserts or soft-deletes a review, and ``rating`` is
+derived from them (rounded to two decimals), so a write never re-reads the
+product's reviews and no rounding error accumulates. On PostgreSQL the
+review change is a data-modifying CTE feeding the ``UPDATE products``; other
+dialects run the two statements back to back in the caller's transaction.
+Both forms adjust the counters relative to their current values, so
+concurrent reviews of one product do not overwrite each other.
+
+A second review of the same product by the same user is rejected by the
+unique index on ``(user_id, product_id)``: the insert is
+``INSERT ... ON CONFLICT DO NOTHING RETURNING``, so a duplicate simply
+returns no row, without a separate lookup and without a race between the
+check and the insert.
+
+``reconcile_review_aggregates`` rebuilds the counters from ``reviews`` for
+the case they drift (manual edits, restored dumps); run it periodically with
+``python -m app.services.review_aggregates``.
+"""
+
+import asyncio
+
+from loguru import logger
+from sqlalchemy import Numeric, and_, case, cast, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.backend.db import async_session_maker, engine
+from app.models.products import Product
+from app.models.reviews import Review
+from app.services.query_cache import track_write
+
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def star_of(grade: float) -> int:
+    """Histogram bucket of a grade: whole stars, 4.5 counts as 4."""
+
+    return min(max(int(grade), 1), 5)
+
+
+def star_expression(grade):
+    """:func:`star_of` as SQL (``CAST`` rounds on PostgreSQL and truncates on SQLite, so compare instead)."""
+
+    return case(*((grade >= star, star) for star in STARS[:0:-1]), else_=1)
+
+
+def stars_column(star: int):
+    return getattr(Product, f"stars_{star}")
+
+
+def _rating(review_count, grade_sum):
+    return case(
+        (review_count > 0, func.round(cast(grade_sum / review_count, Numeric), 2)),
+        else_=0.0,
+    )
+
+
+def insert_reviews(dialect_name: str):
+    """``INSERT INTO reviews`` that skips rows clashing with an existing ``(user_id, product_id)``."""
+
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    return dialect_insert(Review).on_conflict_do_nothing(index_elements=[Review.user_id, Review.product_id])
+
+
+def shift_aggregates(product_id, reviews, grades, stars: dict):
+    """UPDATE products adding ``reviews`` to the count, ``grades`` to the grade sum
+    and ``stars[N]`` to ``stars_N`` (all may be negative)."""
+
+    review_count = Product.review_count + reviews
+    grade_sum = Product.grade_sum + grades
+    histogram = {f"stars_{star}": stars_column(star) + delta for star, delta in stars.items()}
+    return (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(review_count=review_count, grade_sum=grade_sum, rating=_rating(review_count, grade_sum), **histogram)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _apply(product_id, grade, step: int):
+    """Shift the aggregates by one review of ``grade`` (``step`` is +1 or -1)."""
+
+    if isinstance(grade, (int, float)):
+        stars = {star_of(grade): step}
+    else:
+        # Оценка приходит из CTE: корзина выбирается в самом запросе.
+        star = star_expression(grade)
+        stars = {candidate: case((star == candidate, step), else_=0) for candidate in STARS}
+    return shift_aggregates(product_id, step, step * grade, stars)
+
+
+async def add_review_with_aggregates(db: AsyncSession, **values) -> bool:
+    """Insert an active review and count it into its product.
+
+    Returns ``False`` when the user has already reviewed the product (the
+    product itself must exist; the caller checks it).
+    """
+
+    dialect_name = db.bind.dialect.name
+    new_review = (
+        insert_reviews(dialect_name)
+        .values(is_active=True, **values)
+        .returning(Review.product_id, Review.grade)
+    )
+    if dialect_name == "postgresql":
+        # При конфликте CTE пуст, и UPDATE не затрагивает товар.
+        inserted = new_review.cte("new_review")
+        track_write(db, Review.__tablename__)
+        return await db.scalar(_apply(inserted.c.product_id, inserted.c.grade, 1)) is not None
+
+    row = (await db.execute(new_review)).first()
+    if row is None:
+        return False
+    await db.scalar(_apply(row.product_id, row.grade, 1))
+    return True
+
+
+async def deactivate_review_with_aggregates(db: AsyncSession, review_id: int) -> bool:
+    """Soft-delete an active review and discount it. Returns ``False`` if there was no such review."""
+
+    deactivated = (
+        update(Review)
+        .where(Review.id == review_id, Review.is_active == True)
+        .values(is_active=False)
+        .returning(Review.product_id, Review.grade)
+        .execution_options(synchronize_session=False)
+    )
+    if db.bind.dialect.name == "postgresql":
+        changed = deactivated.cte("deactivated_review")
+        track_write(db, Review.__tablename__)
+        return await db.scalar(_apply(changed.c.product_id, changed.c.grade, -1)) is not None
+
+    row = (await db.execute(deactivated)).first()
+    if row is None:
+        return False
+    await db.scalar(_apply(row.product_id, row.grade, -1))
+    return True
+
+
+async def reconcile_review_aggregates(db: AsyncSession) -> int:
+    """Rebuild the aggregates of the whole catalog from ``reviews`` in one ``UPDATE ... FROM``.
+
+    Only products whose stored values disagree are touched (their row
+    version changes, so their ETags do too). Returns the number of fixed
+    products; the caller commits.
+    """
+
+    active = and_(Review.product_id == Product.id, Review.is_active == True)
+    star = star_expression(Review.grade)
+    stats = (
+        select(
+            Product.id.label("product_id"),
+            func.count(Review.grade).label("review_count"),
+            func.coalesce(func.sum(Review.grade), 0.0).label("grade_sum"),
+            # count по grade, а не по 1: у товара без отзывов grade NULL, а CASE для NULL дал бы корзину 1.
+            *(func.count(case((star == candidate, Review.grade))).label(f"stars_{candidate}") for candidate in STARS),
+        )
+        .outerjoin(Review, active)
+        .group_by(Product.id)
+        .subquery("review_stats")
+    )
+    rating = _rating(stats.c.review_count, stats.c.grade_sum)
+    histogram = {f"stars_{candidate}": stats.c[f"stars_{candidate}"] for candidate in STARS}
+    result = await db.execute(
+        update(Product)
+        .where(
+            Product.id == stats.c.product_id,
+            or_(
+                Product.review_count != stats.c.review_count,
+                Product.grade_sum != stats.c.grade_sum,
+                Product.rating != rating,
+                *(stars_column(candidate) != stats.c[f"stars_{candidate}"] for candidate in STARS),
+            ),
+        )
+        .values(review_count=stats.c.review_count, grade_sum=stats.c.grade_sum, rating=rating, **histogram)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def main() -> None:
+    async with async_session_maker() as session:
+        fixed = await reconcile_review_aggregates(session)
+        await session.commit()
+    await engine.dispose()
+    logger.info(f"Review aggregates fixed for {fixed} product(s)")
+
+
+if __name__ == "__main__":
+    # Периодическая сверка: python -m app.services.review_aggregates
+    asyncio.run(main())
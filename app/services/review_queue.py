@@ -0,0 +1,212 @@
+"""Write-behind ingestion of reviews for submission spikes.
+
+``POST /v1/reviews/buffered`` only puts the review into a bounded in-process
+queue and answers 202. A background task collects up to
+``REVIEW_BATCH_SIZE`` queued reviews (or whatever arrived within
+``REVIEW_FLUSH_INTERVAL``) and writes them in one transaction: one lookup of
+existing products, one multi-row ``INSERT ... ON CONFLICT DO NOTHING
+RETURNING`` (duplicates of ``(user_id, product_id)`` are skipped by the
+unique index) and one aggregate ``UPDATE`` per affected product.
+
+When the queue is full a submission waits up to ``REVIEW_QUEUE_PUT_TIMEOUT``
+and then fails with :class:`ReviewQueueFull`, which the endpoint turns into
+503, so a spike slows clients down instead of growing memory. On shutdown
+:meth:`ReviewQueue.drain` stops accepting reviews and flushes what is left.
+
+A batch whose write fails (e.g. the database is briefly unreachable) is
+retried ``REVIEW_FLUSH_RETRIES`` times with exponential backoff starting at
+``REVIEW_FLUSH_BACKOFF`` seconds; meanwhile the queue fills up and new
+submissions get 503. If it still fails, its reviews are written one by one,
+so a single bad review does not take the batch with it; reviews that fail
+even then are logged with their full content.
+
+The queue lives in the worker process: reviews accepted but not yet flushed
+are lost if the process is killed, and rejected ones (unknown product,
+duplicate) are only logged.
+"""
+
+import asyncio
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.backend.db import async_session_maker
+from app.core.settings import settings
+from app.models.products import Product
+from app.models.reviews import Review
+from app.services.query_cache import publish_session_writes
+from app.services.review_aggregates import insert_reviews, shift_aggregates, star_of
+
+
+class ReviewQueueFull(Exception):
+    """The buffer stayed full for the whole put timeout (or the queue is draining)."""
+
+
+class PendingReview(NamedTuple):
+    user_id: int
+    product_id: int
+    comment: str | None
+    grade: float
+
+
+class ReviewQueue:
+    """Bounded buffer of reviews flushed to the database in batches."""
+
+    def __init__(
+            self,
+            maxsize: int = settings.review_queue_size,
+            batch_size: int = settings.review_batch_size,
+            flush_interval: float = settings.review_flush_interval,
+            put_timeout: float = settings.review_queue_put_timeout,
+            flush_retries: int = settings.review_flush_retries,
+            flush_backoff: float = settings.review_flush_backoff,
+            session_factory: async_sessionmaker = async_session_maker,
+    ):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.flush_retries = flush_retries
+        self.flush_backoff = flush_backoff
+        self.session_factory = session_factory
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        # Очередь и задача создаются в цикле событий воркера при первом отзыве.
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return self._queue
+
+    async def submit(self, review: PendingReview) -> None:
+        """Queue a review, waiting for room up to ``put_timeout`` seconds.
+
+        Raises:
+            ReviewQueueFull: No room freed up in time, or the queue is draining.
+        """
+
+        if self._closed:
+            raise ReviewQueueFull("Review queue is shutting down")
+        queue = self._ensure_worker()
+        try:
+            await asyncio.wait_for(queue.put(review), self.put_timeout)
+        except asyncio.TimeoutError:
+            raise ReviewQueueFull("Review queue is full") from None
+
+    async def _next_batch(self) -> list[PendingReview]:
+        queue = self._queue
+        batch = [await queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list[PendingReview]) -> int:
+        """Flush a batch, retrying with backoff and finally review by review. Never raises."""
+
+        delay = self.flush_backoff
+        for attempt in range(self.flush_retries + 1):
+            try:
+                return await self.flush(batch)
+            except Exception as exc:
+                if attempt == self.flush_retries:
+                    logger.error(f"Review batch of {len(batch)} failed after {attempt + 1} attempt(s): {exc}")
+                    break
+                logger.warning(f"Review batch of {len(batch)} failed, retrying in {delay:g}s: {exc}")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        # Повторы не помогли: пишем по одному, чтобы проблемный отзыв не погубил всю пачку.
+        written = 0
+        for review in batch:
+            try:
+                written += await self.flush([review])
+            except Exception as exc:
+                logger.error(f"Buffered review lost: {review._asdict()}: {exc}")
+        return written
+
+    async def flush(self, batch: list[PendingReview]) -> int:
+        """Write a batch of reviews in one transaction. Returns the number of inserted reviews."""
+
+        async with self.session_factory() as session:
+            product_ids = {review.product_id for review in batch}
+            known = set(await session.scalars(select(Product.id).where(Product.id.in_(product_ids))))
+            values = []
+            for review in batch:
+                if review.product_id in known:
+                    values.append({**review._asdict(), "is_active": True})
+                else:
+                    logger.warning(f"Buffered review dropped: product {review.product_id} not found")
+            if not values:
+                return 0
+
+            # Повторы — и с уже записанными отзывами, и внутри пачки — пропускает уникальный индекс.
+            inserted = (await session.execute(
+                insert_reviews(session.bind.dialect.name).returning(Review.product_id, Review.grade),
+                values,
+            )).all()
+            if len(inserted) < len(values):
+                logger.warning(f"Buffered reviews dropped as duplicates: {len(values) - len(inserted)}")
+
+            shifts: defaultdict[int, list] = defaultdict(lambda: [0, 0.0, Counter()])
+            for product_id, grade in inserted:
+                shift = shifts[product_id]
+                shift[0] += 1
+                shift[1] += grade
+                shift[2][star_of(grade)] += 1
+            # Один UPDATE на товар, в порядке id — как и при резервировании остатков, без взаимных блокировок.
+            for product_id, (reviews, grades, stars) in sorted(shifts.items()):
+                await session.execute(shift_aggregates(product_id, reviews, grades, stars))
+            await session.commit()
+            await publish_session_writes(session)
+        return len(inserted)
+
+    async def drain(self) -> None:
+        """Stop accepting reviews, flush everything queued and stop the worker."""
+
+        self._closed = True
+        if self._queue is None:
+            return
+        if self._worker is not None and not self._worker.done():
+            await self._queue.join()
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        else:
+            # Воркер завершился аварийно: оставшиеся в очереди отзывы записываем сами.
+            leftover = []
+            while not self._queue.empty():
+                leftover.append(self._queue.get_nowait())
+                self._queue.task_done()
+            for start in range(0, len(leftover), self.batch_size):
+                await self._write(leftover[start:start + self.batch_size])
+        self._worker = None
+
+
+review_queue = ReviewQueue()
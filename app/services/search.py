@@ -0,0 +1,92 @@
+"""Full-text search over product names and descriptions.
+
+PostgreSQL uses the generated ``products.search_vector`` column and its GIN
+index, SQLite (the test database) uses the ``products_fts`` FTS5 table. Both
+structures are declared next to the model in ``app/models/products.py``.
+Other dialects fall back to ``ILIKE`` without ranking.
+"""
+
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import Float, Integer, func, literal, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.sql import column, table
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.products import Product
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_search_vector = literal_column("products.search_vector", type_=TSVECTOR)
+_products_fts = table("products_fts", column("rowid", Integer), column("products_fts"))
+
+
+@dataclass(frozen=True)
+class ProductSearch:
+    """Search predicate and a relevance score (higher is more relevant)."""
+
+    condition: ColumnElement
+    rank: ColumnElement
+
+
+def search_terms(query: str) -> list[str]:
+    """Split user input into lowercase word tokens, dropping operators and punctuation."""
+
+    return _TERM_RE.findall(query.lower())
+
+
+def _postgres_search(terms: list[str]) -> ProductSearch:
+    # Каждое слово ищется как префикс, чтобы поиск работал по мере набора текста.
+    tsquery = func.to_tsquery(
+        literal_column("'simple'::regconfig"),
+        " & ".join(f"'{term}':*" for term in terms),
+    )
+    return ProductSearch(
+        condition=_search_vector.op("@@")(tsquery),
+        rank=func.ts_rank_cd(_search_vector, tsquery, type_=Float),
+    )
+
+
+def _sqlite_search(terms: list[str]) -> ProductSearch:
+    match = literal(" ".join(f'"{term}"*' for term in terms))
+    matches = _products_fts.c.products_fts.op("MATCH")(match)
+    # bm25() возвращает отрицательные значения: чем меньше, тем релевантнее.
+    rank = (
+        select(-func.bm25(literal_column("products_fts"), type_=Float))
+        .where(matches, _products_fts.c.rowid == Product.id)
+        .scalar_subquery()
+    )
+    return ProductSearch(
+        condition=Product.id.in_(select(_products_fts.c.rowid).where(matches)),
+        rank=rank,
+    )
+
+
+def _like_search(query: str) -> ProductSearch:
+    pattern = f"%{query}%"
+    return ProductSearch(
+        condition=or_(Product.name.ilike(pattern), Product.description.ilike(pattern)),
+        rank=literal(0.0, type_=Float),
+    )
+
+
+def product_search(dialect_name: str, query: str) -> ProductSearch:
+    """Build the search predicate for ``query`` on the given SQL dialect.
+
+    Args:
+        dialect_name: Name of the dialect the query will run on (``session.bind.dialect.name``).
+        query: Raw search string from the client.
+
+    Returns:
+        Predicate to add to the listing filters and a relevance expression for ordering.
+    """
+
+    terms = search_terms(query)
+    if not terms:
+        return _like_search(query)
+    if dialect_name == "postgresql":
+        return _postgres_search(terms)
+    if dialect_name == "sqlite":
+        return _sqlite_search(terms)
+    return _like_search(query)
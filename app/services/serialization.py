@@ -0,0 +1,70 @@
+"""Fast JSON serialization of Core rows for list endpoints.
+
+List endpoints read plain column rows (no ORM instances, no identity map)
+and hand them to :func:`json_response`, which encodes the payload straight
+to bytes. FastAPI passes a returned ``Response`` through untouched, so the
+per-item Pydantic validation and the second ``response_model`` pass are
+skipped; the declared ``response_model`` still documents the shape, and
+:func:`project` keeps items limited to the schema's fields in its order.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, Mapping, Sequence
+
+from fastapi import HTTPException, Query, Response, status
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional accelerator
+    orjson = None
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode ``payload`` the way Pydantic would render the same values."""
+
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode()
+
+
+def project(rows: Iterable[Mapping[str, Any]], fields: Sequence[str]) -> list[dict[str, Any]]:
+    """Keep only ``fields`` of each row, in that order."""
+
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def sparse_fields(allowed: Sequence[str]) -> Callable[..., tuple[str, ...]]:
+    """Build a dependency parsing ``fields=a,b`` into a subset of ``allowed``.
+
+    The result keeps the schema order; without the parameter every field is
+    returned. Unknown or empty selections are rejected with 422.
+    """
+
+    allowed = tuple(allowed)
+
+    def dependency(
+            fields: str | None = Query(None, description="Поля ответа через запятую; по умолчанию все"),
+    ) -> tuple[str, ...]:
+        if fields is None:
+            return allowed
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested.difference(allowed)
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Unknown fields: {', '.join(sorted(unknown)) or '-'}. Allowed: {', '.join(allowed)}",
+            )
+        return tuple(name for name in allowed if name in requested)
+
+    return dependency
+
+
+def json_response(payload: Any, *, headers: Mapping[str, str] | None = None) -> Response:
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
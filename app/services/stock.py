@@ -0,0 +1,106 @@
+"""Atomic stock reservation and release.
+
+Every change is a single conditional statement::
+
+    UPDATE products SET stock = stock - :n
+    WHERE id = :id AND is_active AND stock >= :n
+    RETURNING stock
+
+so concurrent buyers never read-modify-write the row. The database row lock
+serialises them for the duration of one statement instead of a whole
+request. Multi-item reservations lock rows in ascending id order, which
+rules out lock-order deadlocks between two carts sharing products. The
+caller owns the transaction: commit on success, roll back on error to undo
+the items already reserved.
+"""
+
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.products import Product
+
+
+class StockError(Exception):
+    """Base class for reservation failures; ``product_id`` names the offending item."""
+
+    def __init__(self, product_id: int, message: str):
+        super().__init__(message)
+        self.product_id = product_id
+
+
+class ProductNotFoundError(StockError):
+    pass
+
+
+class InsufficientStockError(StockError):
+    pass
+
+
+class StockLevel(NamedTuple):
+    product_id: int
+    stock: int
+    name: str | None
+    slug: str | None
+
+
+def merge_quantities(items: Iterable[tuple[int, int]]) -> dict[int, int]:
+    """Sum quantities per product id and order the result by id."""
+
+    merged: dict[int, int] = {}
+    for product_id, quantity in items:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    return dict(sorted(merged.items()))
+
+
+def _returning(stmt):
+    return stmt.returning(Product.id, Product.stock, Product.name, Product.slug)
+
+
+async def reserve_stock(db: AsyncSession, items: Iterable[tuple[int, int]]) -> list[StockLevel]:
+    """Take the requested units of every product, in id order, or raise.
+
+    Returns:
+        Stock left after the reservation, per product.
+
+    Raises:
+        ProductNotFoundError: The product does not exist or is inactive.
+        InsufficientStockError: Fewer units than requested are left.
+    """
+
+    levels = []
+    for product_id, quantity in merge_quantities(items).items():
+        row = (await db.execute(_returning(
+            update(Product)
+            .where(Product.id == product_id, Product.is_active == True, Product.stock >= quantity)
+            .values(stock=Product.stock - quantity)
+        ))).first()
+        if row is None:
+            # Неудача — редкий путь: только здесь выясняем, нет товара или не хватает остатка.
+            exists = await db.scalar(select(Product.id).where(Product.id == product_id, Product.is_active == True))
+            if exists is None:
+                raise ProductNotFoundError(product_id, f"Product {product_id} not found")
+            raise InsufficientStockError(product_id, f"Not enough stock for product {product_id}")
+        levels.append(StockLevel(*row))
+    return levels
+
+
+async def release_stock(db: AsyncSession, items: Iterable[tuple[int, int]]) -> list[StockLevel]:
+    """Give previously reserved units back, in id order.
+
+    Raises:
+        ProductNotFoundError: The product does not exist or is inactive.
+    """
+
+    levels = []
+    for product_id, quantity in merge_quantities(items).items():
+        row = (await db.execute(_returning(
+            update(Product)
+            .where(Product.id == product_id, Product.is_active == True)
+            .values(stock=Product.stock + quantity)
+        ))).first()
+        if row is None:
+            raise ProductNotFoundError(product_id, f"Product {product_id} not found")
+        levels.append(StockLevel(*row))
+    return levels
@@ -0,0 +1,146 @@
+"""In-memory prefix index backing product autocomplete.
+
+Every worker keeps its own sorted array of ``(key, product_id)`` pairs and
+answers prefix lookups with :func:`bisect.bisect_left`, so suggestions never
+hit the database. The product write endpoints update the index of the worker
+that handled the write; other workers converge through a periodic background
+rebuild (``SUGGEST_REFRESH_INTERVAL``).
+"""
+
+import asyncio
+import time
+from bisect import bisect_left, insort
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.backend.db import async_session_maker
+from app.core.settings import settings
+from app.models.products import LISTED_PRODUCT, Product
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over product names and slugs.
+
+    A product is indexed under its full name, every word-suffix of the name
+    (so ``"phone"`` finds ``"Smart phone"``) and its slug.
+    """
+
+    def __init__(self):
+        self._keys: list[tuple[str, int]] = []
+        self._products: dict[int, tuple[str, str]] = {}
+        self.loaded_at: float | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    @staticmethod
+    def _keys_for(name: str, slug: str) -> set[str]:
+        words = _normalize(name).split(" ")
+        keys = {" ".join(words[index:]) for index in range(len(words))}
+        keys.add(_normalize(slug))
+        keys.discard("")
+        return keys
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def add(self, product_id: int, name: str | None, slug: str | None) -> None:
+        """Index a product, replacing any previous entry for the same id."""
+
+        self.discard(product_id)
+        name, slug = name or "", slug or ""
+        self._products[product_id] = (name, slug)
+        for key in self._keys_for(name, slug):
+            insort(self._keys, (key, product_id))
+
+    def discard(self, product_id: int) -> None:
+        """Remove a product from the index if it is present."""
+
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        for key in self._keys_for(*entry):
+            index = bisect_left(self._keys, (key, product_id))
+            if index < len(self._keys) and self._keys[index] == (key, product_id):
+                del self._keys[index]
+
+    def replace(self, rows) -> None:
+        """Swap the whole index for one built from ``(id, name, slug)`` rows."""
+
+        products = {product_id: (name or "", slug or "") for product_id, name, slug in rows}
+        keys = sorted(
+            (key, product_id)
+            for product_id, (name, slug) in products.items()
+            for key in self._keys_for(name, slug)
+        )
+        self._products, self._keys = products, keys
+        self.loaded_at = time.monotonic()
+
+    def clear(self) -> None:
+        self._products, self._keys = {}, []
+        self.loaded_at = None
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[str, str]]:
+        """Return up to ``limit`` ``(name, slug)`` pairs whose keys start with ``prefix``.
+
+        Matches come in key order, so shorter and alphabetically earlier
+        completions are suggested first.
+        """
+
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        keys = self._keys
+        results: list[tuple[str, str]] = []
+        seen: set[int] = set()
+        for index in range(bisect_left(keys, (prefix,)), len(keys)):
+            key, product_id = keys[index]
+            if not key.startswith(prefix):
+                break
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            results.append(self._products[product_id])
+            if len(results) >= limit:
+                break
+        return results
+
+    async def refresh(self, session_factory: async_sessionmaker = async_session_maker) -> None:
+        """Rebuild the index from the active, in-stock catalog."""
+
+        async with session_factory() as session:
+            result = await session.execute(
+                select(Product.id, Product.name, Product.slug)
+                .where(*LISTED_PRODUCT)
+            )
+            rows = result.all()
+        self.replace(rows)
+
+    def schedule_refresh(self) -> None:
+        """Start a background rebuild when the index is older than the refresh interval."""
+
+        if self.loaded_at is None:
+            return
+        if time.monotonic() - self.loaded_at < settings.suggest_refresh_interval:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_quietly())
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as exc:
+            logger.error(f"Product suggestion index refresh failed: {exc}")
+
+
+product_suggestions = PrefixIndex()
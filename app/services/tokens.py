@@ -0,0 +1,144 @@
+"""Verified-token cache and access-token revocation.
+
+``get_current_user`` verifies the HS256 signature and the claims of a token
+once. The resulting claims are kept in :data:`verified_tokens`, a bounded
+LRU keyed by the SHA-256 of the token, until the token's ``exp``.
+
+Role changes and deactivation must take effect before the token expires.
+:data:`token_revocations` therefore keeps, per affected user, the time of
+the last change. Tokens issued (``iat``) before it are rejected, whether
+they are cached or not. The map only holds users changed within the last
+token lifetime, because older tokens have expired anyway, so it stays small
+and every check is a dict lookup with no database query.
+
+With ``AUTH_REDIS_URL`` set, revocations are also stored in a Redis hash and
+announced on a channel. Every worker loads the hash at startup and applies
+announcements as they arrive. Without it, revocations only reach the worker
+that made them.
+"""
+
+import asyncio
+import hashlib
+import time
+
+from loguru import logger
+
+from app.core.settings import settings
+from app.services.cache import TTLCache
+
+_HASH = "auth:revoked"
+_CHANNEL = "auth:revocations"
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenRevocations:
+    """``user_id -> revoked_at`` for users whose tokens were invalidated recently."""
+
+    def __init__(self, lifetime: float = settings.access_token_ttl, redis_url: str | None = settings.auth_redis_url):
+        self.lifetime = lifetime
+        self.redis_url = redis_url
+        self._revoked: dict[int, float] = {}
+        self._redis = None
+        self._listener: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def _client(self):
+        if self.redis_url is None:
+            return None
+        if self._redis is None:
+            from redis.asyncio import Redis
+
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+    def _apply(self, user_id: int, revoked_at: float) -> None:
+        self._revoked[user_id] = max(revoked_at, self._revoked.get(user_id, 0.0))
+        self._prune()
+
+    def _prune(self) -> None:
+        horizon = time.time() - self.lifetime
+        for user_id in [user_id for user_id, revoked_at in self._revoked.items() if revoked_at < horizon]:
+            del self._revoked[user_id]
+
+    def is_revoked(self, user_id: int, issued_at: float | None) -> bool:
+        revoked_at = self._revoked.get(user_id)
+        if revoked_at is None:
+            return False
+        # Токены без iat выпущены до появления отзыва — считаем их старыми.
+        return issued_at is None or issued_at <= revoked_at
+
+    async def revoke_user(self, user_id: int) -> None:
+        """Reject every token of ``user_id`` issued up to now, in all workers."""
+
+        revoked_at = time.time()
+        self._apply(user_id, revoked_at)
+        client = self._client()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.hset(_HASH, str(user_id), repr(revoked_at))
+                pipe.publish(_CHANNEL, f"{user_id}:{revoked_at!r}")
+                await pipe.execute()
+        except Exception as exc:
+            logger.error(f"Token revocation for user {user_id} was not shared: {exc}")
+
+    async def _load(self, client) -> None:
+        stored = await client.hgetall(_HASH)
+        horizon = time.time() - self.lifetime
+        stale = []
+        for user_id, revoked_at in stored.items():
+            if float(revoked_at) < horizon:
+                stale.append(user_id)
+            else:
+                self._apply(int(user_id), float(revoked_at))
+        if stale:
+            # Заодно чистим общий хэш от отзывов старше срока жизни токена.
+            await client.hdel(_HASH, *stale)
+
+    async def start(self) -> None:
+        """Load shared revocations and follow new ones (no-op without Redis)."""
+
+        if self._client() is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        client = self._client()
+        while True:
+            try:
+                async with client.pubsub() as pubsub:
+                    # Сначала подписка, потом чтение хэша: отзыв между ними не теряется.
+                    await pubsub.subscribe(_CHANNEL)
+                    await self._load(client)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        user_id, _, revoked_at = message["data"].decode().partition(":")
+                        self._apply(int(user_id), float(revoked_at))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Token revocation listener failed, reconnecting: {exc}")
+                await asyncio.sleep(1)
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def clear(self) -> None:
+        self._revoked.clear()
+
+
+verified_tokens = TTLCache(maxsize=settings.token_cache_size, ttl=settings.access_token_ttl)
+token_revocations = TokenRevocations()
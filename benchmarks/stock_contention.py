@@ -0,0 +1,120 @@
+"""Hot-product checkout benchmark: many concurrent buyers, one product.
+
+Compares the conditional ``UPDATE ... WHERE stock >= :n RETURNING`` used by
+``app.services.stock.reserve_stock`` with the read-modify-write that a full
+``update_product`` amounts to. Each buyer runs in its own session and
+transaction, as concurrent requests do.
+
+Usage (against a migrated database; a throwaway product is created and
+removed)::
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.stock_contention --buyers 500 --stock 100
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import delete, select
+
+from app.backend.db import Base, async_session_maker, engine
+from app.models import Category, Product
+from app.services.stock import InsufficientStockError, reserve_stock
+
+
+async def _atomic_buy(product_id: int) -> bool:
+    async with async_session_maker() as session:
+        try:
+            await reserve_stock(session, [(product_id, 1)])
+        except InsufficientStockError:
+            await session.rollback()
+            return False
+        await session.commit()
+        return True
+
+
+async def _naive_buy(product_id: int) -> bool:
+    async with async_session_maker() as session:
+        product = await session.get(Product, product_id)
+        if product.stock < 1:
+            return False
+        # Между чтением и записью остаток могут изменить другие покупатели — обновление теряется.
+        await asyncio.sleep(0)
+        product.stock = product.stock - 1
+        await session.commit()
+        return True
+
+
+async def _run(buy, product_id: int, buyers: int) -> tuple[int, Counter, list[float], float]:
+    latencies: list[float] = []
+    # Отказ по остатку — это «не продано»; прочие исключения (таймауты пула, ошибки БД) считаются отдельно.
+    errors: Counter = Counter()
+
+    async def timed() -> bool:
+        started = time.perf_counter()
+        try:
+            return await buy(product_id)
+        except Exception as exc:
+            errors[type(exc).__name__] += 1
+            return False
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(timed() for _ in range(buyers)))
+    return sum(results), errors, latencies, time.perf_counter() - started
+
+
+async def main(buyers: int, stock: int) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    suffix = uuid.uuid4().hex[:8]
+    async with async_session_maker() as session:
+        category = Category(name=f"bench-{suffix}", slug=f"bench-{suffix}")
+        product = Product(
+            name=f"bench-{suffix}", slug=f"bench-{suffix}", description="", price=1,
+            image_url="", stock=stock, category=category,
+        )
+        session.add_all([category, product])
+        await session.commit()
+        product_id, category_id = product.id, category.id
+
+    try:
+        for label, buy in (("atomic", _atomic_buy), ("read-modify-write", _naive_buy)):
+            async with async_session_maker() as session:
+                product = await session.get(Product, product_id)
+                product.stock = stock
+                await session.commit()
+
+            sold, errors, latencies, elapsed = await _run(buy, product_id, buyers)
+            async with async_session_maker() as session:
+                left = await session.scalar(select(Product.stock).where(Product.id == product_id))
+            latencies.sort()
+            print(
+                f"{label:>18}: sold={sold} left={left} lost_updates={sold - (stock - left)} "
+                f"elapsed={elapsed:.3f}s throughput={buyers / elapsed:.0f} req/s "
+                f"p50={statistics.median(latencies) * 1000:.1f}ms "
+                f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms "
+                f"errors={sum(errors.values())}"
+            )
+            if errors:
+                # Результат с ошибками не сравним с чистым прогоном: скорее всего, мал пул (DB_POOL_SIZE, DB_MAX_OVERFLOW).
+                print(f"{'':>18}  errors by type: {dict(errors)}")
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(delete(Product).where(Product.id == product_id))
+            await session.execute(delete(Category).where(Category.id == category_id))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=100)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.buyers, arguments.stock))
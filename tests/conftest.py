@@ -15,6 +15,11 @@ from app.models import reviews as _reviews  # noqa: F401
 from app.models import user as _user  # noqa: F401
 
 from app.backend.db import Base, engine, async_session_maker
+from app.services.category_tree import category_tree
+from app.services.counting import clear_count_cache
+from app.services.query_cache import query_cache
+from app.services.suggest import product_suggestions
+from app.services.tokens import token_revocations, verified_tokens
 
 import pytest_asyncio
 
@@ -24,6 +29,12 @@ async def prepare_database():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    clear_count_cache()
+    product_suggestions.clear()
+    category_tree.invalidate()
+    query_cache.clear()
+    verified_tokens.clear()
+    token_revocations.clear()
     yield
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
@@ -32,4 +43,20 @@ async def prepare_database():
 @pytest_asyncio.fixture
 async def db_session():
     async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+@pytest_asyncio.fixture
+async def client():
+    from fastapi import FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    from app.routers.v1 import category, products, reviews
+
+    app = FastAPI()
+    app.include_router(category.router)
+    app.include_router(products.router)
+    app.include_router(reviews.router)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as http_client:
+        yield http_client
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.models.user import User
+from app.routers.v1 import auth
+from app.routers.v1.auth import authenticate_user, create_access_token, get_current_user
+from app.routers.v1.permission import supplier_permission
+from app.services.passwords import PasswordHasher
+from app.services.tokens import token_revocations
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_off_the_event_loop():
+    hasher = PasswordHasher(rounds=10, workers=1)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    task = asyncio.create_task(ticker())
+    try:
+        # Три вызова на один поток: два ждут слота, цикл событий тем временем свободен.
+        hashes = await asyncio.gather(*(hasher.hash(f"password-{index}") for index in range(3)))
+    finally:
+        task.cancel()
+        hasher.shutdown()
+
+    assert ticks > 10
+    assert all(hash_.startswith("$2b$10$") for hash_ in hashes)
+    stats = hasher.stats()
+    assert stats["calls"] == 3 and stats["waiting"] == 0
+    assert stats["wait_max_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_with_new_cost(db_session, monkeypatch):
+    old = PasswordHasher(rounds=4, workers=1)
+    async with db_session.begin():
+        user = User(
+            first_name="Max",
+            last_name="Payne",
+            username="maxpayne",
+            email="max@example.com",
+            hashed_password=await old.hash("secret-pass"),
+        )
+        db_session.add(user)
+    old.shutdown()
+
+    current = PasswordHasher(rounds=5, workers=1)
+    monkeypatch.setattr(auth, "password_hasher", current)
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            await authenticate_user(db_session, "maxpayne", "wrong-pass")
+        assert exc_info.value.status_code == 401
+        assert (await db_session.scalar(select(User.hashed_password))).startswith("$2b$04$")
+
+        await authenticate_user(db_session, "maxpayne", "secret-pass")
+        stored = await db_session.scalar(select(User.hashed_password))
+        assert stored.startswith("$2b$05$")
+        assert await current.verify("secret-pass", stored)
+    finally:
+        current.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_verified_tokens_are_cached_and_revoked_on_role_change(db_session, monkeypatch):
+    async with db_session.begin():
+        user = User(
+            first_name="Sam",
+            last_name="Seller",
+            username="samseller",
+            email="sam@example.com",
+            hashed_password="hashed",
+        )
+        db_session.add(user)
+    user_id = user.id
+
+    decodes = 0
+    decode = auth.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        nonlocal decodes
+        decodes += 1
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    token = await create_access_token("samseller", user_id, False, False, True, expires_delta=timedelta(minutes=5))
+
+    first = await get_current_user(token)
+    second = await get_current_user(token)
+    assert first == second and first["is_customer"] is True
+    assert decodes == 1
+
+    response = await supplier_permission(db_session, {"is_admin": True}, user_id)
+    assert response.transaction == "User is supplier now"
+    assert len(token_revocations) == 1
+
+    # Закэшированный токен со старой ролью отклоняется без обращения к БД.
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(token)
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == "Token has been revoked"
+
+    fresh = await create_access_token("samseller", user_id, False, True, False, expires_delta=timedelta(minutes=5))
+    assert (await get_current_user(fresh))["is_supplier"] is True
+    assert decodes == 2
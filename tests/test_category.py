@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import select, text
+
+from app.models.category import Category
+from app.models.products import Product
+from app.routers.v1.category import delete_category, put_category
+from app.schemas import CreateCategory
+from app.services.category_tree import category_tree
+from app.services.query_cache import query_cache
+
+
+@pytest.mark.asyncio
+async def test_category_listing_includes_whole_subtree(db_session, client):
+    async with db_session.begin():
+        root = Category(name="Electronics", slug="electronics")
+        phones = Category(name="Phones", slug="phones")
+        db_session.add_all([root, phones])
+        await db_session.flush()
+        phones.parent_id = root.id
+        smartphones = Category(name="Smartphones", slug="smartphones", parent_id=phones.id)
+        books = Category(name="Books", slug="books")
+        db_session.add_all([smartphones, books])
+        await db_session.flush()
+        db_session.add_all([
+            Product(name="Radio", slug="radio", description="", price=1, image_url="", stock=1, category_id=root.id),
+            Product(name="Flagship", slug="flagship", description="", price=1, image_url="",
+                    stock=1, category_id=smartphones.id),
+            Product(name="Novel", slug="novel", description="", price=1, image_url="", stock=1, category_id=books.id),
+        ])
+
+    # Холодный кэш: поддерево вычисляется рекурсивным CTE.
+    response = await client.get("/products/electronics")
+    assert {item["slug"] for item in response.json()["items"]} == {"radio", "flagship"}
+
+    await category_tree.refresh()
+    assert category_tree.get() is not None
+    response = await client.get("/products/phones")
+    assert [item["slug"] for item in response.json()["items"]] == ["flagship"]
+
+    # Перенос ветки инвалидирует кэш, следующий запрос видит новое дерево.
+    admin = {"is_admin": True}
+    await put_category(db_session, "phones", CreateCategory(name="Phones", parent_id=books.id), admin)
+    assert category_tree.get() is None
+    response = await client.get("/products/books")
+    assert {item["slug"] for item in response.json()["items"]} == {"novel", "flagship"}
+
+    await delete_category(db_session, "books", admin)
+    await category_tree.refresh()
+    response = await client.get("/products/books")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_query_cache_is_bypassed_with_zero_ttl(monkeypatch, db_session):
+    monkeypatch.setattr(query_cache, "ttl", 0)
+    slugs = select(Category.slug).order_by(Category.id)
+    assert await query_cache.fetch(db_session, slugs) == []
+
+    # Запись другого воркера: версии таблиц в этом процессе не меняются.
+    await db_session.execute(text("INSERT INTO categories (name, slug, is_active) VALUES ('Late', 'late', 1)"))
+    await db_session.commit()
+    assert await query_cache.fetch(db_session, slugs) == [{"slug": "late"}]
+    assert len(query_cache._entries) == 0
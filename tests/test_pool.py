@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.backend.db import engine, engine_options
+from app.backend.pool import InstrumentedPool, pool_status
+
+
+def test_engine_options_follow_settings_and_driver():
+    options = engine_options("postgresql+asyncpg://user:secret@db/shop")
+    assert options["poolclass"] is InstrumentedPool
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"prepared_statement_cache_size": 100, "statement_cache_size": 100}
+    assert "connect_args" not in engine_options("sqlite+aiosqlite:///./shop.db")
+    assert engine_options("sqlite+aiosqlite://") == {}
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_count_checkouts_overflow_and_timeouts(tmp_path):
+    assert isinstance(engine.pool, InstrumentedPool)
+
+    small = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedPool, pool_size=1, max_overflow=1, pool_timeout=0.05,
+    )
+    try:
+        first = await small.connect()
+        second = await small.connect()  # сверх pool_size — overflow
+        status = pool_status(small.pool)
+        assert status["checked_out"] == 2 and status["overflow"] == 1
+        assert status["overflow_events"] == 1
+
+        with pytest.raises(exc.TimeoutError):
+            await small.connect()
+        await second.close()
+        async with small.connect() as third:
+            await third.execute(text("SELECT 1"))
+        await first.close()
+
+        status = pool_status(small.pool)
+        assert status["checkouts"] == 3
+        assert status["timeouts"] == 1
+        assert status["checked_out"] == 0
+        assert status["wait_max_ms"] >= 0
+    finally:
+        await small.dispose()
@@ -0,0 +1,542 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import event, select, text, update
+
+from app.backend.db import async_session_maker, engine
+
+from app.models.category import Category
+from app.models.products import Product
+from app.routers.v1.products import (
+    ProductSort,
+    _product_filters,
+    create_product,
+    delete_product,
+    release_products_stock,
+    reserve_products_stock,
+    update_product,
+)
+from app.schemas import CreateProduct, ProductBatchResponse, ProductListResponse, ProductRead, StockRequest
+from app.services.product_import import ImportFormat, ProductImport, parse_records
+from app.services.stock import InsufficientStockError, reserve_stock
+
+
+async def _seed_products(db_session, count: int = 25) -> list[Product]:
+    async with db_session.begin():
+        category = Category(name="Electronics", slug="electronics")
+        products = [
+            Product(
+                name=f"Product {index}",
+                slug=f"product-{index}",
+                description="Test product",
+                price=index * 10,
+                image_url="http://example.com/img.jpg",
+                stock=5,
+                category=category,
+            )
+            for index in range(count)
+        ]
+        db_session.add_all([category, *products])
+    return products
+
+
+@pytest.mark.asyncio
+async def test_cursor_pagination_walks_whole_catalog(db_session, client):
+    products = await _seed_products(db_session)
+
+    seen: list[int] = []
+    response = await client.get("/products/", params={"limit": 10})
+    body = response.json()
+    seen.extend(item["id"] for item in body["items"])
+    while body["next_cursor"]:
+        response = await client.get("/products/", params={"limit": 10, "cursor": body["next_cursor"]})
+        assert response.status_code == 200
+        body = response.json()
+        seen.extend(item["id"] for item in body["items"])
+
+    assert seen == sorted(product.id for product in products)
+    assert body["total"] == 25
+
+
+@pytest.mark.asyncio
+async def test_offset_mode_still_supported_and_cursor_validated(db_session, client):
+    await _seed_products(db_session, count=5)
+
+    response = await client.get("/products/electronics", params={"limit": 2, "offset": 4})
+    body = response.json()
+    assert [item["slug"] for item in body["items"]] == ["product-4"]
+    assert body["next_cursor"] is None
+
+    response = await client.get("/products/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 422
+
+    response = await client.get("/products/", params={"cursor": body["items"][0]["slug"], "offset": 1})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_count_strategies(db_session, client):
+    await _seed_products(db_session, count=3)
+
+    response = await client.get("/products/", params={"limit": 2, "count": "none"})
+    body = response.json()
+    assert body["total"] is None
+    assert body["has_more"] is True
+
+    response = await client.get("/products/", params={"limit": 2, "count": "cached"})
+    assert response.json()["total"] == 3
+
+    async with db_session.begin():
+        db_session.add(Product(
+            name="Late arrival",
+            slug="late-arrival",
+            description="Test product",
+            price=5,
+            image_url="http://example.com/img.jpg",
+            stock=1,
+            category_id=1,
+        ))
+
+    # Кэшированный total живёт до истечения TTL, точный подсчёт видит новую строку.
+    response = await client.get("/products/", params={"limit": 2, "count": "cached"})
+    assert response.json()["total"] == 3
+    response = await client.get("/products/", params={"limit": 2, "count": "estimated"})
+    assert response.json()["total"] == 4
+
+
+@pytest.mark.asyncio
+async def test_full_text_search_ranks_and_keeps_price_filters(db_session, client):
+    async with db_session.begin():
+        category = Category(name="Phones", slug="phones")
+        db_session.add_all([
+            category,
+            Product(name="Phone case", slug="phone-case", description="Leather case for a phone",
+                    price=10, image_url="", stock=3, category=category),
+            Product(name="Charger", slug="charger", description="Fast charger for phone and tablet",
+                    price=20, image_url="", stock=3, category=category),
+            Product(name="Smart phone", slug="smart-phone", description="Phone with a phone-grade camera",
+                    price=500, image_url="", stock=3, category=category),
+            Product(name="Tablet", slug="tablet", description="Big screen",
+                    price=300, image_url="", stock=3, category=category),
+        ])
+
+    response = await client.get("/products/", params={"search": "phon"})
+    slugs = [item["slug"] for item in response.json()["items"]]
+    assert set(slugs) == {"phone-case", "charger", "smart-phone"}
+    assert slugs[-1] == "charger"
+
+    response = await client.get("/products/phones", params={"search": "phone", "max_price": 100, "limit": 1})
+    body = response.json()
+    assert body["total"] == 2
+    next_page = await client.get(
+        "/products/phones",
+        params={"search": "phone", "max_price": 100, "limit": 1, "cursor": body["next_cursor"]},
+    )
+    assert {body["items"][0]["slug"], next_page.json()["items"][0]["slug"]} == {"phone-case", "charger"}
+
+    # Правка названия сразу попадает в индекс.
+    async with db_session.begin():
+        tablet = await db_session.scalar(select(Product).where(Product.slug == "tablet"))
+        tablet.name = "Tablet phone"
+    response = await client.get("/products/", params={"search": "tablet phone"})
+    assert [item["slug"] for item in response.json()["items"]] == ["tablet", "charger"]
+
+
+@pytest.mark.asyncio
+async def test_suggest_follows_catalog_writes(db_session, client):
+    await _seed_products(db_session, count=3)
+
+    response = await client.get("/products/suggest", params={"q": "prod"})
+    assert [item["slug"] for item in response.json()] == ["product-0", "product-1", "product-2"]
+
+    admin = {"id": None, "is_admin": True, "is_supplier": False}
+    await create_product(db_session, CreateProduct(
+        name="Smart Speaker", description="Speaker", price=50, image_url="", stock=2, category=1,
+    ), admin)
+    await update_product(db_session, "product-1", CreateProduct(
+        name="Product One", description="Renamed", price=10, image_url="", stock=2, category=1,
+    ), admin)
+    await delete_product(db_session, "product-2", admin)
+
+    response = await client.get("/products/suggest", params={"q": "SPEAK"})
+    assert response.json() == [{"name": "Smart Speaker", "slug": "smart-speaker"}]
+    response = await client.get("/products/suggest", params={"q": "product", "limit": 5})
+    assert [item["slug"] for item in response.json()] == ["product-0", "product-one"]
+
+
+@pytest.mark.asyncio
+async def test_product_detail_is_cached_until_a_tracked_write(db_session, client):
+    await _seed_products(db_session, count=1)
+
+    response = await client.get("/products/detail/product-0")
+    assert response.json()["price"] == 0
+
+    # Запись в обход сессии не меняет версию таблицы — ответ берётся из кэша.
+    async with engine.begin() as connection:
+        await connection.execute(update(Product).where(Product.slug == "product-0").values(price=999))
+    response = await client.get("/products/detail/product-0")
+    assert response.json()["price"] == 0
+
+    # Запись через сессию повышает версию products и сбрасывает все зависящие от неё записи.
+    admin = {"id": None, "is_admin": True, "is_supplier": False}
+    await update_product(db_session, "product-0", CreateProduct(
+        name="Product 0", description="Updated", price=15, image_url="", stock=2, category=1,
+    ), admin)
+    response = await client.get("/products/detail/product-0")
+    assert response.json()["price"] == 15
+    assert response.json()["description"] == "Updated"
+
+
+@pytest.mark.asyncio
+async def test_etag_revalidation_for_detail_and_listing(db_session, client):
+    await _seed_products(db_session, count=3)
+
+    response = await client.get("/products/detail/product-0")
+    etag = response.headers["ETag"]
+    response = await client.get("/products/detail/product-0", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    listing = await client.get("/products/", params={"limit": 2})
+    list_etag = listing.headers["ETag"]
+    response = await client.get("/products/", params={"limit": 2}, headers={"If-None-Match": list_etag})
+    assert response.status_code == 304
+    # Другая страница — другой ETag.
+    response = await client.get("/products/", params={"limit": 2, "offset": 1}, headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+
+    admin = {"id": None, "is_admin": True, "is_supplier": False}
+    await update_product(db_session, "product-0", CreateProduct(
+        name="Product 0", description="Updated", price=15, image_url="", stock=2, category=1,
+    ), admin)
+
+    response = await client.get("/products/detail/product-0", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    response = await client.get("/products/", params={"limit": 2}, headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != list_etag
+
+
+async def _chunks(payload: bytes, size: int = 7):
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_reports_rows_and_allocates_unique_slugs(db_session):
+    await _seed_products(db_session, count=1)
+
+    ndjson = "\n".join([
+        '{"name": "Product 0", "description": "d", "price": 1, "image_url": "", "stock": 1, "category": 1}',
+        '{"name": "Product 0", "description": "d", "price": 2, "image_url": "", "stock": 1, "category": 1}',
+        '{"name": "Broken", ',
+        '',
+        '{"name": "Lamp", "description": "d", "price": "x", "image_url": "", "stock": 1, "category": 1}',
+        '{"name": "Lamp", "description": "d", "price": 3, "image_url": "", "stock": 0, "category": 42}',
+        '{"name": "Lamp", "description": "d", "price": 4, "image_url": "", "stock": 1, "category": 1}',
+    ]).encode()
+    summary = await ProductImport(db_session, supplier_id=None, batch_size=2).run(
+        parse_records(ImportFormat.ndjson, _chunks(ndjson))
+    )
+    assert summary.created == 3
+    assert [(error.row, error.error.split(":")[0]) for error in summary.errors] == [
+        (3, "Invalid JSON"), (5, "price"), (6, "Category not found!"),
+    ]
+
+    csv_payload = (
+        "name,description,price,image_url,stock,category\r\n"
+        '"Lamp","Warm, soft\nlight",5,,2,1\r\n'
+        "Desk,Oak,7,,1\r\n"
+    ).encode("utf-8-sig")
+    summary = await ProductImport(db_session, supplier_id=None).run(
+        parse_records(ImportFormat.csv, _chunks(csv_payload))
+    )
+    assert summary.created == 1
+    assert [error.row for error in summary.errors] == [4]
+
+    slugs = (await db_session.scalars(select(Product.slug).order_by(Product.id))).all()
+    assert slugs == ["product-0", "product-0-1", "product-0-2", "lamp", "lamp-1"]
+    lamp = await db_session.scalar(select(Product).where(Product.slug == "lamp-1"))
+    assert lamp.description == "Warm, soft\nlight"
+
+
+@pytest.mark.asyncio
+async def test_export_streams_filtered_catalog_as_ndjson(db_session, client):
+    await _seed_products(db_session, count=5)
+
+    response = await client.get("/products/export", params={"min_price": 20, "gzip": False})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["slug"] for item in lines] == ["product-2", "product-3", "product-4"]
+    assert set(lines[0]) == set(ProductRead.model_fields)
+
+    # httpx прозрачно распаковывает Content-Encoding: gzip.
+    response = await client.get("/products/export", params={"gzip": True})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 5
+
+
+@pytest.mark.asyncio
+async def test_facets_follow_filters_in_one_aggregate(db_session, client):
+    await _seed_products(db_session, count=5)
+    async with db_session.begin():
+        db_session.add(Product(
+            name="Lamp", slug="lamp", description="", price=7, image_url="", stock=1,
+            category=Category(name="Home", slug="home"),
+        ))
+
+    response = await client.get("/products/", params={"facets": True, "limit": 1})
+    facets = response.json()["facets"]
+    assert facets["categories"] == [{"category_id": 1, "count": 5}, {"category_id": 2, "count": 1}]
+    assert sum(bucket["count"] for bucket in facets["price"]) == 6
+    assert facets["price"][0] == {"min": 0, "max": 4, "count": 1}
+    assert facets["price"][-1]["max"] == 40
+
+    response = await client.get("/products/", params={"facets": True, "max_price": 10})
+    facets = response.json()["facets"]
+    assert facets["categories"] == [{"category_id": 1, "count": 2}, {"category_id": 2, "count": 1}]
+    assert [bucket["count"] for bucket in facets["price"]] == [1, 0, 0, 0, 0, 0, 1, 0, 0, 1]
+
+    response = await client.get("/products/")
+    assert response.json()["facets"] is None
+
+    # Товар без цены считается в категории, но не ломает гистограмму.
+    async with db_session.begin():
+        db_session.add(Product(
+            name="Draft", slug="draft", description="", price=None, image_url="", stock=1, category_id=2,
+        ))
+    response = await client.get("/products/", params={"facets": True})
+    facets = response.json()["facets"]
+    assert facets["categories"] == [{"category_id": 1, "count": 5}, {"category_id": 2, "count": 2}]
+    assert sum(bucket["count"] for bucket in facets["price"]) == 6
+
+
+@pytest.mark.asyncio
+async def test_sorts_page_through_in_requested_order(db_session, client):
+    products = await _seed_products(db_session, count=6)
+    async with db_session.begin():
+        for product, rating in zip(products, [3.0, 5.0, 1.0, 5.0, 2.0, 4.0]):
+            product.rating = rating
+
+    expected = {
+        "price_asc": [f"product-{index}" for index in range(6)],
+        "price_desc": [f"product-{index}" for index in reversed(range(6))],
+        "newest": [f"product-{index}" for index in reversed(range(6))],
+        "rating": ["product-3", "product-1", "product-5", "product-0", "product-4", "product-2"],
+    }
+    for sort, slugs in expected.items():
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 4, "sort": sort}
+            if cursor:
+                params["cursor"] = cursor
+            body = (await client.get("/products/", params=params)).json()
+            seen += [item["slug"] for item in body["items"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == slugs, sort
+
+    # Курсор одной сортировки не принимается другой.
+    body = (await client.get("/products/", params={"limit": 2, "sort": "price_asc"})).json()
+    response = await client.get("/products/", params={"sort": "price_desc", "cursor": body["next_cursor"]})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_price_sorts_page_past_products_without_price(db_session, client):
+    products = await _seed_products(db_session, count=6)
+    async with db_session.begin():
+        for index in (1, 4):
+            products[index].price = None
+
+    priced = [f"product-{index}" for index in (0, 2, 3, 5)]
+    for sort, slugs in {"price_asc": priced, "price_desc": priced[::-1]}.items():
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 1, "sort": sort}
+            if cursor:
+                params["cursor"] = cursor
+            body = (await client.get("/products/", params=params)).json()
+            assert body["total"] == 4
+            seen += [item["slug"] for item in body["items"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == slugs, sort
+
+    # Без сортировки по цене товары без цены остаются в выдаче.
+    body = (await client.get("/products/")).json()
+    assert body["total"] == 6
+
+
+@pytest.mark.asyncio
+async def test_listing_sorts_use_partial_indexes(db_session):
+    await _seed_products(db_session, count=3)
+
+    category_filter = Product.category_id.in_([1, 2])
+    price_filter = (Product.price >= 10, Product.price <= 100)
+    async with engine.connect() as connection:
+        for sort in ProductSort:
+            for extra in ((), (category_filter,), price_filter, (category_filter, *price_filter)):
+                filters, order = _product_filters(db_session, None, None, None, sort)
+                stmt = select(Product.id).where(*filters, *extra).order_by(*order.order_by()).limit(11)
+                compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+                params = tuple(compiled.params[name] for name in compiled.positiontup)
+                plan = (await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)).all()
+                details = [row[-1] for row in plan if "products" in row[-1]]
+                # Таблица читается только через индекс — без последовательного SCAN products.
+                assert details and all("USING" in detail and "INDEX" in detail for detail in details), (sort, extra, details)
+
+
+@pytest.mark.asyncio
+async def test_list_fast_path_keeps_response_schema(db_session, client):
+    await _seed_products(db_session, count=3)
+
+    response = await client.get("/products/", params={"limit": 2, "facets": True})
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert ProductListResponse.model_validate_json(response.content).model_dump(mode="json") == body
+    assert list(body["items"][0]) == list(ProductRead.model_fields)
+
+
+@pytest.mark.asyncio
+async def test_sparse_fieldsets_are_pushed_down_to_sql(db_session, client):
+    await _seed_products(db_session, count=3)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        response = await client.get("/products/", params={"fields": "name, price,id", "limit": 2})
+        detail = await client.get("/products/detail/product-1", params={"fields": "slug"})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    assert [list(item) for item in response.json()["items"]] == [["id", "name", "price"]] * 2
+    assert detail.json() == {"slug": "product-1"}
+    assert not any("products.description" in statement for statement in statements)
+
+    response = await client.get("/products/", params={"fields": "name,secret"})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_batch_lookup_keeps_request_order_and_marks_missing(db_session, client):
+    products = await _seed_products(db_session, count=3)
+    async with db_session.begin():
+        products[1].stock = 0
+
+    response = await client.post(
+        "/products/batch",
+        json={"slugs": ["product-2", "missing", "product-1", "product-0", "product-2"]},
+        params={"fields": "slug,price"},
+    )
+    assert response.json()["items"] == [
+        {"key": "product-2", "found": True, "product": {"slug": "product-2", "price": 20}},
+        {"key": "missing", "found": False, "product": None},
+        {"key": "product-1", "found": False, "product": None},
+        {"key": "product-0", "found": True, "product": {"slug": "product-0", "price": 0}},
+        {"key": "product-2", "found": True, "product": {"slug": "product-2", "price": 20}},
+    ]
+
+    response = await client.post("/products/batch", json={"ids": [products[0].id, 999]})
+    body = response.json()
+    assert ProductBatchResponse.model_validate(body).items[0].product.slug == "product-0"
+    assert body["items"][1] == {"key": 999, "found": False, "product": None}
+
+    assert (await client.post("/products/batch", json={})).status_code == 422
+    assert (await client.post("/products/batch", json={"ids": list(range(301))})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_reserve_is_all_or_nothing_and_release_restores(db_session):
+    products = await _seed_products(db_session, count=2)
+    first, second = (product.id for product in products)
+    admin = {"id": None, "is_admin": True, "is_supplier": False}
+
+    reserved = await reserve_products_stock(db_session, StockRequest(items=[
+        {"product_id": second, "quantity": 2}, {"product_id": first, "quantity": 1},
+        {"product_id": second, "quantity": 1},
+    ]), admin)
+    assert [(item.product_id, item.stock) for item in reserved.items] == [(first, 4), (second, 2)]
+
+    with pytest.raises(HTTPException) as exc_info:
+        await reserve_products_stock(db_session, StockRequest(items=[
+            {"product_id": first, "quantity": 1}, {"product_id": second, "quantity": 3},
+        ]), admin)
+    assert exc_info.value.status_code == 409
+    stocks = (await db_session.execute(select(Product.id, Product.stock).order_by(Product.id))).all()
+    assert stocks == [(first, 4), (second, 2)]
+
+    with pytest.raises(HTTPException) as exc_info:
+        await reserve_products_stock(db_session, StockRequest(items=[{"product_id": 999, "quantity": 1}]), admin)
+    assert exc_info.value.status_code == 404
+
+    released = await release_products_stock(db_session, StockRequest(items=[{"product_id": second, "quantity": 3}]), admin)
+    assert [(item.product_id, item.stock) for item in released.items] == [(second, 5)]
+
+
+@pytest.mark.asyncio
+async def test_reserve_is_admin_only_and_caps_quantity(db_session):
+    products = await _seed_products(db_session, count=1)
+    customer = {"id": 1, "is_admin": False, "is_supplier": False}
+    stock_request = StockRequest(items=[{"product_id": products[0].id, "quantity": 1}])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await reserve_products_stock(db_session, stock_request, customer)
+    assert exc_info.value.status_code == 403
+    assert await db_session.scalar(select(Product.stock).where(Product.id == products[0].id)) == 5
+
+    with pytest.raises(ValidationError):
+        StockRequest(items=[{"product_id": products[0].id, "quantity": 1001}])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_buyers_never_oversell(db_session):
+    products = await _seed_products(db_session, count=1)
+    product_id = products[0].id
+    async with db_session.begin():
+        products[0].stock = 30
+
+    async def buy() -> bool:
+        async with async_session_maker() as session:
+            try:
+                await reserve_stock(session, [(product_id, 1)])
+            except InsufficientStockError:
+                await session.rollback()
+                return False
+            await session.commit()
+            return True
+
+    results = await asyncio.gather(*(buy() for _ in range(100)))
+    assert sum(results) == 30
+    assert await db_session.scalar(select(Product.stock).where(Product.id == product_id)) == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_reports_foreign_key_violation_as_such(db_session):
+    await _seed_products(db_session, count=1)
+    # SQLite по умолчанию не проверяет внешние ключи — включаем, чтобы удалённая категория сорвала вставку.
+    await db_session.execute(text("PRAGMA foreign_keys=ON"))
+    importer = ProductImport(db_session, supplier_id=None)
+    importer._categories[77] = True  # категорию удалили после проверки пачки
+    try:
+        summary = await importer.run(parse_records(ImportFormat.ndjson, _chunks(
+            b'{"name": "Ghost", "description": "d", "price": 1, "image_url": "", "stock": 1, "category": 77}'
+        )))
+    finally:
+        # PRAGMA остаётся на соединении в пуле; пересоздаём соединения для остальных тестов.
+        await db_session.close()
+        await engine.dispose()
+    assert summary.created == 0
+    assert summary.errors[0].error == "Category or supplier was deleted during the import, batch rolled back"
+    assert importer._categories == {}
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.services.rate_limit import MemoryBuckets, RateLimit, RateLimitMiddleware, default_rules
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _app(clock: Clock, **options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/v1/products/")
+    async def products(search: str | None = None):
+        return {"search": search}
+
+    @app.post("/v1/auth/token")
+    async def token():
+        return {"access_token": "token"}
+
+    options.setdefault("default_limit", RateLimit.parse("5/10"))
+    options.setdefault("rules", default_rules())
+    app.add_middleware(RateLimitMiddleware, backend=MemoryBuckets(clock=clock), **options)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_token_buckets_limit_clients_and_expensive_routes(monkeypatch):
+    monkeypatch.setattr("app.services.rate_limit.settings.rate_limit_auth", "2/60")
+    monkeypatch.setattr("app.services.rate_limit.settings.rate_limit_search", "3/30")
+    clock = Clock()
+    app = _app(clock)
+
+    async with AsyncClient(transport=ASGITransport(app=app, client=("10.0.0.1", 1)), base_url="http://test") as client:
+        first = await client.get("/v1/products/")
+        assert first.status_code == 200
+        assert first.headers["RateLimit-Limit"] == "5"
+        assert first.headers["RateLimit-Remaining"] == "4"
+        assert first.headers["RateLimit-Policy"] == "5;w=10"
+
+        # Поиск — своя, более строгая корзина; заголовки показывают её.
+        searches = [await client.get("/v1/products/", params={"search": "phone"}) for _ in range(4)]
+        assert [response.status_code for response in searches] == [200, 200, 200, 429]
+        assert searches[2].headers["RateLimit-Limit"] == "3"
+        assert searches[3].headers["Retry-After"] == "10"
+
+        # Отказ по поиску не списал общий токен: один ещё остался.
+        assert (await client.get("/v1/products/")).status_code == 200
+        exhausted = await client.get("/v1/products/")
+        assert exhausted.status_code == 429
+        assert exhausted.headers["Retry-After"] == "2"
+
+        clock.now += 2
+        assert (await client.get("/v1/products/")).status_code == 200
+
+        clock.now += 60
+        logins = [await client.post("/v1/auth/token") for _ in range(3)]
+        assert [response.status_code for response in logins] == [200, 200, 429]
+
+    # Другой клиент не делит корзины с первым.
+    async with AsyncClient(transport=ASGITransport(app=app, client=("10.0.0.2", 1)), base_url="http://test") as client:
+        assert (await client.post("/v1/auth/token")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_in_flight_cap_sheds_load():
+    release = asyncio.Event()
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        await release.wait()
+        return {}
+
+    app.add_middleware(
+        RateLimitMiddleware, backend=MemoryBuckets(), default_limit=RateLimit.parse("100/1"), rules=(), max_in_flight=2,
+    )
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        pending = [asyncio.create_task(client.get("/slow")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        shed = await client.get("/slow")
+        release.set()
+        done = await asyncio.gather(*pending)
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "1"
+    assert [response.status_code for response in done] == [200, 200]
+
+
+@pytest.mark.asyncio
+async def test_spoofed_forwarded_for_does_not_reset_buckets():
+    clock = Clock()
+    app = _app(clock, default_limit=RateLimit.parse("2/60"), rules=(), trusted_proxies=1)
+
+    # Запросы приходят от nginx (10.0.0.5); он дописывает реальный адрес клиента справа.
+    async with AsyncClient(transport=ASGITransport(app=app, client=("10.0.0.5", 1)), base_url="http://test") as client:
+        statuses = [
+            (await client.get("/v1/products/", headers={"X-Forwarded-For": f"1.1.1.{attempt}, 203.0.113.7"})).status_code
+            for attempt in range(3)
+        ]
+        assert statuses == [200, 200, 429]
+        # Другой реальный клиент за тем же прокси получает свою корзину.
+        other = await client.get("/v1/products/", headers={"X-Forwarded-For": "1.1.1.1, 198.51.100.2"})
+        assert other.status_code == 200
+
+    # Клиент, подключившийся напрямую с публичного адреса, заголовком свою корзину не выбирает.
+    async with AsyncClient(transport=ASGITransport(app=app, client=("93.184.216.34", 1)), base_url="http://test") as client:
+        statuses = [
+            (await client.get("/v1/products/", headers={"X-Forwarded-For": f"1.1.1.{attempt}"})).status_code
+            for attempt in range(3)
+        ]
+        assert statuses == [200, 200, 429]
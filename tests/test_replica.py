@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.backend import db, db_depends
+from app.backend.db import REPLICA_SESSION, Base
+from app.backend.replica import PRIMARY_COOKIE, ReadYourWritesMiddleware, ReplicaHealth, primary_pinned
+from app.models.category import Category
+from app.routers.v1 import category
+from app.routers.v1.auth import get_current_user
+from app.services.query_cache import query_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def _replica(monkeypatch, url: str, **health_options) -> ReplicaHealth:
+    """Подключаем вторую базу как реплику вместо DATABASE_REPLICA_URL."""
+
+    replica_engine = create_async_engine(url)
+    session_maker = async_sessionmaker(
+        replica_engine, expire_on_commit=False, class_=AsyncSession, info={REPLICA_SESSION: True},
+    )
+    health = ReplicaHealth(replica_engine, **health_options)
+    monkeypatch.setattr(db, "replica_session_maker", session_maker)
+    monkeypatch.setattr(db_depends, "replica_session_maker", session_maker)
+    monkeypatch.setattr(db_depends, "replica_health", health)
+    return health
+
+
+@pytest_asyncio.fixture
+async def replica_client():
+    app = FastAPI()
+    app.include_router(category.router)
+    app.dependency_overrides[get_current_user] = lambda: {"id": 1, "is_admin": True}
+    app.add_middleware(ReadYourWritesMiddleware, window=5)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as http_client:
+        yield http_client
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_client_writes(monkeypatch, tmp_path, db_session, replica_client):
+    health = await _replica(monkeypatch, f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with health.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # Содержимое реплики отличается от основной базы — по ответу видно, откуда он прочитан.
+    async with db.replica_session_maker() as replica_session, replica_session.begin():
+        replica_session.add(Category(name="Stale", slug="stale"))
+
+    try:
+        response = await replica_client.get("/category/")
+        assert [item["slug"] for item in response.json()] == ["stale"]
+
+        response = await replica_client.post("/category/", json={"name": "Fresh"})
+        assert response.status_code == 201
+        assert PRIMARY_COOKIE in response.headers["set-cookie"]
+
+        # Автор записи читает из основной базы и видит своё изменение.
+        response = await replica_client.get("/category/")
+        assert [item["slug"] for item in response.json()] == ["fresh"]
+        assert health.replica_reads == 1 and health.primary_reads == 1
+
+        # Остальные клиенты по-прежнему читают реплику; закэшированный ответ основной базы им не достаётся.
+        replica_client.cookies.clear()
+        response = await replica_client.get("/category/")
+        assert [item["slug"] for item in response.json()] == ["stale"]
+    finally:
+        await health.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_unavailable_or_lagging_replica_falls_back_to_primary(monkeypatch, tmp_path, db_session, replica_client):
+    async with db_session.begin():
+        db_session.add(Category(name="Primary", slug="primary"))
+
+    clock = FakeClock()
+    health = await _replica(
+        monkeypatch, f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}", retry_after=30, clock=clock,
+    )
+    try:
+        response = await replica_client.get("/category/")
+        assert [item["slug"] for item in response.json()] == ["primary"]
+        assert health.down and health.failures == 1
+
+        # Пока реплика помечена недоступной, проверки не повторяются.
+        assert await health.usable() is False and health.failures == 1
+        clock.now += 31
+        assert await health.usable() is False and health.failures == 2
+    finally:
+        await health.engine.dispose()
+
+    class LaggingHealth(ReplicaHealth):
+        async def _measure(self) -> float:
+            return 12.5
+
+    lagging = LaggingHealth(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'lagging.db'}"), max_lag=5)
+    assert await lagging.usable() is False
+    assert lagging.lag == 12.5 and not lagging.down
+
+
+@pytest.mark.asyncio
+async def test_replica_results_are_cached_no_longer_than_max_lag(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.services.query_cache.settings.replica_max_lag", 0.05)
+    health = await _replica(monkeypatch, f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with health.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    slugs = select(Category.slug).order_by(Category.id)
+
+    try:
+        async with db.replica_session_maker() as session:
+            assert await query_cache.fetch(session, slugs) == []
+            # Репликация догоняет мимо сессий приложения: версия таблицы не меняется.
+            async with health.engine.begin() as conn:
+                await conn.execute(insert(Category).values(name="Late", slug="late"))
+            assert await query_cache.fetch(session, slugs) == []
+
+            await asyncio.sleep(0.06)
+            assert await query_cache.fetch(session, slugs) == [{"slug": "late"}]
+    finally:
+        await health.engine.dispose()
+
+
+def test_primary_pin_cookie_is_bounded_by_window():
+    now = time.time()
+    assert primary_pinned({PRIMARY_COOKIE: f"{now + 3:.3f}"}, window=5)
+    assert not primary_pinned({PRIMARY_COOKIE: f"{now - 1:.3f}"}, window=5)
+    # Значение далеко за окном не продлевает привязку к основной базе.
+    assert not primary_pinned({PRIMARY_COOKIE: f"{now + 3600:.3f}"}, window=5)
+    assert not primary_pinned({PRIMARY_COOKIE: "garbage"}, window=5)
+    assert not primary_pinned({}, window=5)
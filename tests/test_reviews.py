@@ -1,12 +1,20 @@
+import asyncio
+
 import pytest
-from sqlalchemy import select
+from fastapi import HTTPException
+from sqlalchemy import event, select
+from sqlalchemy.exc import OperationalError
+
+from app.backend.db import engine
 
 from app.models.category import Category
 from app.models.products import Product
 from app.models.reviews import Review
 from app.models.user import User
 from app.routers.v1.reviews import add_review, delete_review
-from app.schemas import CreateReview
+from app.schemas import CreateReview, ReviewListResponse, ReviewSummary
+from app.services.review_aggregates import reconcile_review_aggregates
+from app.services.review_queue import PendingReview, ReviewQueue, ReviewQueueFull
 
 
 @pytest.mark.asyncio
@@ -67,6 +75,8 @@ async def test_add_review_updates_rating(db_session):
             is_active=True,
         )
         product.rating = 4.5
+        product.review_count = 2
+        product.grade_sum = 9
         db_session.add_all([first_review, second_review])
 
 
@@ -145,4 +155,330 @@ async def test_delete_review_updates_rating_and_handles_empty_state(db_session):
     remaining_reviews = await db_session.scalars(
         select(Review).where(Review.product_id == product.id, Review.is_active == True)
     )
-    assert remaining_reviews.all() == []
\ No newline at end of file
+    assert remaining_reviews.all() == []
+
+
+@pytest.mark.asyncio
+async def test_review_lists_keep_response_schema(db_session, client):
+    async with db_session.begin():
+        product = Product(
+            name="Smartphone",
+            slug="smartphone",
+            description="Test product",
+            price=100,
+            image_url="http://example.com/img.jpg",
+            stock=5,
+            category=Category(name="Electronics", slug="electronics"),
+        )
+        db_session.add(product)
+        await db_session.flush()
+        db_session.add_all([
+            Review(product_id=product.id, comment=f"Review {index}", grade=index, is_active=True)
+            for index in range(1, 4)
+        ])
+
+    response = await client.get("/reviews/smartphone", params={"limit": 2})
+    body = response.json()
+    assert ReviewListResponse.model_validate_json(response.content).model_dump(mode="json") == body
+    assert [item["comment"] for item in body["items"]] == ["Review 3", "Review 2"]
+    assert body["total"] == 3 and body["has_more"] is True
+    assert body["items"][0]["grade"] == 3.0
+
+    response = await client.get("/reviews/", params={"fields": "id,comment", "limit": 1})
+    assert response.json()["items"] == [{"id": 3, "comment": "Review 3"}]
+
+    # Цена товара вне фильтра: пустая страница той же формы, total по запрошенной стратегии.
+    for count, total in (("exact", 0), ("none", None)):
+        response = await client.get("/reviews/smartphone", params={"min_price": 500, "count": count})
+        assert response.json() == {
+            "items": [], "total": total, "limit": 10, "offset": 0, "has_more": False, "next_cursor": None,
+        }
+
+
+@pytest.mark.asyncio
+async def test_reconcile_review_aggregates_fixes_drifted_products(db_session):
+    async with db_session.begin():
+        category = Category(name="Garden", slug="garden")
+        user = User(
+            first_name="Tom",
+            last_name="Green",
+            username="tomgreen",
+            email="tom@example.com",
+            hashed_password="hashed",
+        )
+        drifted = Product(
+            name="Shovel", slug="shovel", description="", price=15,
+            image_url="http://example.com/shovel.jpg", stock=3, category=category,
+            review_count=7, grade_sum=30, rating=4.29,
+        )
+        consistent = Product(
+            name="Rake", slug="rake", description="", price=12,
+            image_url="http://example.com/rake.jpg", stock=3, category=category,
+        )
+        db_session.add_all([category, user, drifted, consistent])
+        await db_session.flush()
+        db_session.add_all([
+            Review(user_id=user.id, product_id=drifted.id, comment="Solid", grade=4, is_active=True),
+            Review(user_id=None, product_id=drifted.id, comment="Gone", grade=1, is_active=False),
+        ])
+
+    fixed = await reconcile_review_aggregates(db_session)
+    await db_session.commit()
+    assert fixed == 1
+
+    rows = (await db_session.execute(
+        select(Product.slug, Product.review_count, Product.grade_sum, Product.rating).order_by(Product.slug)
+    )).all()
+    assert [tuple(row) for row in rows] == [("rake", 0, 0.0, 0.0), ("shovel", 1, 4.0, 4.0)]
+
+    assert await reconcile_review_aggregates(db_session) == 0
+
+
+@pytest.mark.asyncio
+async def test_review_queue_flushes_batches_and_skips_rejected(db_session):
+    async with db_session.begin():
+        category = Category(name="Toys", slug="toys")
+        users = [
+            User(first_name="U", last_name=str(index), username=f"user{index}",
+                 email=f"user{index}@example.com", hashed_password="hashed")
+            for index in range(3)
+        ]
+        ball = Product(name="Ball", slug="ball", description="", price=5,
+                       image_url="http://example.com/ball.jpg", stock=9, category=category)
+        kite = Product(name="Kite", slug="kite", description="", price=9,
+                       image_url="http://example.com/kite.jpg", stock=9, category=category,
+                       review_count=1, grade_sum=2, rating=2.0, stars_2=1)
+        db_session.add_all([category, ball, kite, *users])
+        await db_session.flush()
+        db_session.add(Review(user_id=users[0].id, product_id=kite.id, grade=2, is_active=True))
+
+    queue = ReviewQueue(maxsize=10, batch_size=4, flush_interval=0.05, put_timeout=0.1)
+    for user_id, product_id, grade in [
+        (users[0].id, ball.id, 5),
+        (users[1].id, ball.id, 4),
+        (users[1].id, ball.id, 1),    # повтор в той же пачке
+        (users[0].id, kite.id, 5),    # отзыв уже есть в БД
+        (users[2].id, kite.id, 4),
+        (users[2].id, 999, 3),        # нет такого товара
+    ]:
+        await queue.submit(PendingReview(user_id, product_id, None, grade))
+    await queue.drain()
+
+    with pytest.raises(ReviewQueueFull):
+        await queue.submit(PendingReview(users[2].id, ball.id, None, 5))
+
+    rows = (await db_session.execute(
+        select(Product.slug, Product.review_count, Product.grade_sum, Product.rating).order_by(Product.slug)
+    )).all()
+    assert [tuple(row) for row in rows] == [("ball", 2, 9.0, 4.5), ("kite", 2, 6.0, 3.0)]
+    assert await reconcile_review_aggregates(db_session) == 0
+
+
+@pytest.mark.asyncio
+async def test_review_queue_applies_backpressure_when_full():
+    release = asyncio.Event()
+
+    class StalledQueue(ReviewQueue):
+        async def flush(self, batch):
+            await release.wait()
+            return 0
+
+    queue = StalledQueue(maxsize=1, batch_size=1, flush_interval=0, put_timeout=0.05)
+    await queue.submit(PendingReview(1, 1, None, 5))
+    await asyncio.sleep(0)  # воркер забрал первый отзыв и ждёт записи
+    await queue.submit(PendingReview(2, 1, None, 5))
+    with pytest.raises(ReviewQueueFull):
+        await queue.submit(PendingReview(3, 1, None, 5))
+
+    release.set()
+    await queue.drain()
+    assert len(queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_review_queue_retries_failed_batches_and_drains_after_worker_crash():
+    written = []
+
+    class FlakyQueue(ReviewQueue):
+        failures = 1
+
+        async def flush(self, batch):
+            if self.failures:
+                self.failures -= 1
+                raise OperationalError("INSERT INTO reviews", {}, Exception("connection reset"))
+            if any(review.grade > 5 for review in batch):
+                raise ValueError("grade out of range")
+            written.extend(batch)
+            return len(batch)
+
+    options = dict(maxsize=10, batch_size=10, flush_interval=0.01, put_timeout=0.1, flush_backoff=0.01)
+    # Временная ошибка: пачка записывается повторной попыткой.
+    queue = FlakyQueue(**options)
+    await queue.submit(PendingReview(1, 1, None, 5))
+    await queue.drain()
+    assert [review.user_id for review in written] == [1]
+
+    # Пачка так и не записалась: отзывы пишутся по одному, теряется только проблемный.
+    queue = FlakyQueue(flush_retries=1, **options)
+    queue.failures = 0
+    for user_id, grade in [(2, 4), (3, 9), (4, 3)]:
+        await queue.submit(PendingReview(user_id, 1, None, grade))
+    await queue.drain()
+    assert [review.user_id for review in written] == [1, 2, 4]
+
+    # Воркер упал, не разобрав очередь: drain записывает остаток сам.
+    queue = FlakyQueue(**options)
+    queue.failures = 0
+    queue._queue = asyncio.Queue()
+    for user_id in (5, 6):
+        queue._queue.put_nowait(PendingReview(user_id, 1, None, 5))
+
+    async def crashed():
+        raise RuntimeError("worker crashed")
+
+    queue._worker = asyncio.create_task(crashed())
+    await asyncio.gather(queue._worker, return_exceptions=True)
+    await queue.drain()
+    assert [review.user_id for review in written] == [1, 2, 4, 5, 6]
+    assert len(queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_add_review_conflict_uses_unique_index(db_session):
+    async with db_session.begin():
+        category = Category(name="Music", slug="music")
+        user = User(
+            first_name="Ann",
+            last_name="Lee",
+            username="annlee",
+            email="ann@example.com",
+            hashed_password="hashed",
+        )
+        product = Product(
+            name="Guitar", slug="guitar", description="", price=300,
+            image_url="http://example.com/guitar.jpg", stock=2, category=category,
+        )
+        db_session.add_all([category, user, product])
+    product_id, user_id = product.id, user.id
+
+    await add_review(db_session, CreateReview(product_id=product_id, grade=5), {"id": user_id})
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            await add_review(db_session, CreateReview(product_id=product_id, grade=1), {"id": user_id})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+    assert exc_info.value.status_code == 409
+    # Проверка товара и вставка с ON CONFLICT — без отдельного поиска существующего отзыва.
+    assert len(statements) == 2
+    assert "ON CONFLICT" in statements[1]
+    aggregates = (await db_session.execute(
+        select(Product.review_count, Product.grade_sum, Product.rating).where(Product.id == product_id)
+    )).one()
+    assert tuple(aggregates) == (1, 5.0, 5.0)
+
+
+@pytest.mark.asyncio
+async def test_review_summary_reads_maintained_histogram(db_session, client):
+    async with db_session.begin():
+        category = Category(name="Kitchen", slug="kitchen")
+        users = [
+            User(first_name="K", last_name=str(index), username=f"cook{index}",
+                 email=f"cook{index}@example.com", hashed_password="hashed")
+            for index in range(5)
+        ]
+        product = Product(name="Kettle", slug="kettle", description="", price=40,
+                          image_url="http://example.com/kettle.jpg", stock=4, category=category)
+        db_session.add_all([category, product, *users])
+    product_id, user_ids = product.id, [user.id for user in users]
+
+    for user_id, grade in zip(user_ids, [5, 4.5, 2, 1]):
+        await add_review(db_session, CreateReview(product_id=product_id, comment=f"grade {grade}", grade=grade), {"id": user_id})
+    first_review = await db_session.scalar(select(Review.id).where(Review.user_id == user_ids[0]))
+    await delete_review(db_session, first_review, {"is_admin": True})
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        response = await client.get("/reviews/kettle/summary", params={"latest": 2})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 200
+    body = ReviewSummary.model_validate_json(response.content)
+    assert body.review_count == 3
+    assert body.average == pytest.approx(2.5)
+    assert body.distribution == {1: 1, 2: 1, 3: 0, 4: 1, 5: 0}
+    assert [review.comment for review in body.latest] == ["grade 1", "grade 2"]
+    # Строка товара по слагу и последние отзывы — независимо от числа отзывов.
+    assert len(statements) == 2
+    assert await reconcile_review_aggregates(db_session) == 0
+
+    etag = response.headers["ETag"]
+    cached = await client.get("/reviews/kettle/summary", params={"latest": 2}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    await add_review(db_session, CreateReview(product_id=product_id, grade=5), {"id": user_ids[4]})
+    changed = await client.get("/reviews/kettle/summary", params={"latest": 2}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["distribution"]["5"] == 1
+
+    assert (await client.get("/reviews/missing/summary")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_review_feeds_paginate_by_cursor_over_feed_index(db_session, client):
+    async with db_session.begin():
+        category = Category(name="Sports", slug="sports")
+        bike = Product(name="Bike", slug="bike", description="", price=500,
+                       image_url="http://example.com/bike.jpg", stock=1, category=category)
+        helmet = Product(name="Helmet", slug="helmet", description="", price=50,
+                         image_url="http://example.com/helmet.jpg", stock=1, category=category)
+        db_session.add_all([category, bike, helmet])
+        await db_session.flush()
+        db_session.add_all([
+            Review(product_id=(bike if index % 3 else helmet).id, comment=f"Review {index}",
+                   grade=4, is_active=index != 4)
+            for index in range(1, 11)
+        ])
+
+    async def walk(path):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, "fields": "comment"}
+            if cursor:
+                params["cursor"] = cursor
+            body = (await client.get(path, params=params)).json()
+            assert all(list(item) == ["comment"] for item in body["items"])
+            seen += [item["comment"] for item in body["items"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                assert not body["has_more"]
+                return seen
+
+    assert await walk("/reviews/") == [f"Review {index}" for index in (10, 9, 8, 7, 6, 5, 3, 2, 1)]
+    assert await walk("/reviews/bike") == [f"Review {index}" for index in (10, 8, 7, 5, 2, 1)]
+
+    first = (await client.get("/reviews/bike", params={"limit": 2})).json()
+    assert (await client.get("/reviews/bike", params={"cursor": first["next_cursor"], "offset": 2})).status_code == 422
+    assert (await client.get("/reviews/bike", params={"cursor": "garbage"})).status_code == 422
+
+    stmt = (
+        select(Review.id)
+        .where(Review.is_active == True, Review.product_id == 1, Review.id < 100)
+        .order_by(Review.id.desc())
+        .limit(11)
+    )
+    async with engine.connect() as connection:
+        compiled = stmt.compile(dialect=connection.dialect)
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        plan = (await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)).all()
+    details = " ".join(row[-1] for row in plan)
+    # Диапазон индекса без отдельной сортировки.
+    assert "ix_reviews_product_feed" in details
+    assert "TEMP B-TREE" not in details